@@ -0,0 +1,61 @@
+# перенос закрытых выдач из borrowed_books в borrowed_books_archive пачками:
+#   python archive.py --older-than-days 30 --batch-size 1000
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import Session
+
+import db
+from models import BorrowedBooks, ArchivedBorrowedBooks
+from settings import get_settings
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_AFTER_DAYS = 30
+
+
+def move_to_archive(db_session: Session, ids: list[int]):
+    columns = [column.name for column in ArchivedBorrowedBooks.__table__.columns]
+    source_columns = [BorrowedBooks.__table__.c[name] for name in columns]
+    db_session.execute(
+        insert(ArchivedBorrowedBooks).from_select(
+            columns, select(*source_columns).where(BorrowedBooks.id.in_(ids))
+        )
+    )
+    db_session.execute(delete(BorrowedBooks).where(BorrowedBooks.id.in_(ids)))
+
+def archive_returned_loans(db_session: Session, older_than: timedelta = timedelta(days=ARCHIVE_AFTER_DAYS),
+                           batch_size: int = ARCHIVE_BATCH_SIZE, now: datetime | None = None) -> int:
+    cutoff = (now or datetime.now()) - older_than
+    moved = 0
+    while True:
+        ids = db_session.scalars(
+            select(BorrowedBooks.id)
+            .where(BorrowedBooks.return_date.is_not(None), BorrowedBooks.return_date < cutoff)
+            .order_by(BorrowedBooks.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        # каждая пачка - отдельная короткая транзакция
+        move_to_archive(db_session, ids)
+        db_session.commit()
+        moved += len(ids)
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move returned loans to borrowed_books_archive")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db.init_engine(get_settings())
+    with db.SessionLocal() as db_session:
+        moved = archive_returned_loans(db_session, timedelta(days=args.older_than_days), args.batch_size)
+    db.dispose_engine()
+    print(f"archived {moved} loans")
+
+
+if __name__ == "__main__":
+    main()
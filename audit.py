@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from fastapi import Depends, HTTPException, APIRouter, Query, Request
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from models import AuditEntry
+from db import get_db_with_deadline
+from limits import rate_limited, admission, POINT_COST
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(dependencies=[Depends(admission)])
+
+MAX_AUDIT_ENTRIES = 100
+
+# события atomic /batch копятся здесь и уходят в очередь только после commit
+deferred_events = ContextVar("deferred_audit_events", default=None)
+
+
+@contextmanager
+def deferred():
+    events = []
+    token = deferred_events.set(events)
+    try:
+        yield events
+    finally:
+        deferred_events.reset(token)
+
+
+# эндпоинты кладут событие в ограниченную очередь и не ждут бд;
+# фоновая задача (запускается в lifespan) пишет их пачками одним multi-row insert.
+# если очередь полна, запрос ждет не дольше enqueue_timeout, после чего событие отбрасывается
+class AuditLog:
+    def __init__(self, queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1, enqueue_timeout: float = 0.05):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.queue = None
+        self.task = None
+        self.wake = None
+        self.session_factory = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self, session_factory):
+        self.session_factory = session_factory
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.wake = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        # None - признак конца: все, что было в очереди до него, будет записано
+        self.wake.set()
+        await self.queue.put(None)
+        await self.task
+        self.queue = None
+        self.task = None
+
+    async def record(self, actor: str, action: str, entity: str, entity_id: int | None = None):
+        event = {
+            "actor": actor, "action": action, "entity": entity,
+            "entity_id": entity_id, "created_at": datetime.now()
+        }
+        pending = deferred_events.get()
+        if pending is not None:
+            pending.append(event)
+            return
+        await self.enqueue(event)
+
+    async def record_many(self, events: list[dict]):
+        for event in events:
+            await self.enqueue(event)
+
+    async def enqueue(self, event: dict):
+        if self.queue is None:
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(event), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+
+    async def run(self):
+        while True:
+            event = await self.queue.get()
+            if event is None:
+                return
+            if self.queue.qsize() < self.batch_size - 1 and not self.wake.is_set():
+                # ждем, пока накопится пачка
+                try:
+                    await asyncio.wait_for(self.wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            events = [event]
+            stopping = False
+            while len(events) < self.batch_size and not self.queue.empty():
+                event = self.queue.get_nowait()
+                if event is None:
+                    stopping = True
+                    break
+                events.append(event)
+            await run_in_threadpool(self.write, events)
+            if stopping:
+                return
+
+    def write(self, events: list[dict]):
+        try:
+            with self.session_factory() as session:
+                session.execute(insert(AuditEntry), events)
+                session.commit()
+            self.written += len(events)
+        except Exception as e:
+            self.failed += len(events)
+            logger.warning("audit flush of %d events failed: %s", len(events), e)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+# у каждого приложения свой журнал и своя фоновая задача в app.state
+def app_audit_log(request: Request) -> AuditLog:
+    return request.app.state.audit_log
+
+
+async def get_audit_entries(actor: str | None, entity: str | None, entity_id: int | None, limit: int, db: Session):
+    try:
+        query = db.query(AuditEntry)
+        if actor is not None:
+            query = query.filter(AuditEntry.actor == actor)
+        if entity is not None:
+            query = query.filter(AuditEntry.entity == entity)
+        if entity_id is not None:
+            query = query.filter(AuditEntry.entity_id == entity_id)
+        entries = query.order_by(AuditEntry.id.desc()).limit(limit).all()
+        return [{
+            "id": entry.id,
+            "actor": entry.actor,
+            "action": entry.action,
+            "entity": entry.entity,
+            "entity_id": entry.entity_id,
+            "created_at": entry.created_at
+        } for entry in entries]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+@router.get("/audit/get", response_model=list)
+async def audit_get_endpoint(actor: str | None = Query(default=None), entity: str | None = Query(default=None), entity_id: int | None = Query(default=None), limit: int = Query(default=MAX_AUDIT_ENTRIES, ge=1, le=MAX_AUDIT_ENTRIES), current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline"))):
+    return await get_audit_entries(actor, entity, entity_id, limit, db)
+@router.get("/audit/stats", response_model=dict)
+async def audit_stats_endpoint(current_user: str = Depends(rate_limited(POINT_COST)), audit_log: AuditLog = Depends(app_audit_log)):
+    return audit_log.stats()
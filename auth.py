@@ -5,7 +5,6 @@ import json
 import re
 import jwt
 from jwt.exceptions import InvalidTokenError
-from dotenv import load_dotenv
 from pydantic import BaseModel, EmailStr
 from fastapi import Depends, HTTPException, APIRouter
 from fastapi.security import OAuth2PasswordBearer
@@ -14,6 +13,8 @@ from sqlalchemy.orm import Session
 
 from models import Librarian
 from db import get_db
+from queries import librarian_by_email
+from settings import Settings, app_settings, get_settings
 
 router = APIRouter()
 
@@ -28,12 +29,6 @@ class Tokens(BaseModel):
     token_type: str = "bearer"
 
 
-load_dotenv()
-jwt_token = os.getenv("JWT_TOKEN")
-jwt_algorithm = os.getenv("JWT_ALGORITHM")
-jwt_access_te = os.getenv("JWT_ACCESS_TOKEN_EXPIRE")
-jwt_refresh_te = os.getenv("JWT_REFRESH_TOKEN_EXPIRE")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="librarians_login")
 
 
@@ -42,9 +37,9 @@ def normalize_email_for_filename(email: str) -> str:
     return re.sub(r"[^\w]", "_", email)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme), settings: Settings = Depends(app_settings)):
     try:
-        payload = jwt.decode(token, jwt_token, algorithms=[jwt_algorithm])
+        payload = jwt.decode(token, settings.jwt_token, algorithms=[settings.jwt_algorithm])
         token_type = payload.get("type")
         if token_type != "refresh":
             raise HTTPException(status_code=401, detail="Invalid token type")
@@ -55,9 +50,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def verify_token(token: str = Depends(oauth2_scheme)):
+async def verify_token(token: str = Depends(oauth2_scheme), settings: Settings = Depends(app_settings)):
     try:
-        payload = jwt.decode(token, jwt_token, algorithms=[jwt_algorithm])
+        payload = jwt.decode(token, settings.jwt_token, algorithms=[settings.jwt_algorithm])
         token_type = payload.get("type")
         if token_type != "access":
             raise HTTPException(status_code=401, detail="Invalid token type")
@@ -65,22 +60,24 @@ async def verify_token(token: str = Depends(oauth2_scheme)):
     except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def create_access_token(data: dict):
-    expires_delta = timedelta(minutes=int(jwt_access_te))
-    return create_token(data, expires_delta, "access")
+def create_access_token(data: dict, settings: Settings | None = None):
+    settings = settings or get_settings()
+    expires_delta = timedelta(minutes=settings.jwt_access_token_expire)
+    return create_token(data, expires_delta, "access", settings)
 
-def create_refresh_token(data: dict):
-    expires_delta = timedelta(minutes=int(jwt_refresh_te))
-    return create_token(data, expires_delta, "refresh")
+def create_refresh_token(data: dict, settings: Settings | None = None):
+    settings = settings or get_settings()
+    expires_delta = timedelta(minutes=settings.jwt_refresh_token_expire)
+    return create_token(data, expires_delta, "refresh", settings)
 
-def create_token(data: dict, expires_delta: timedelta, token_type: str):
+def create_token(data: dict, expires_delta: timedelta, token_type: str, settings: Settings):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + expires_delta
     to_encode.update({
         "exp": expire,
         "type": token_type
     })
-    encoded_jwt = jwt.encode(to_encode, jwt_token, algorithm=jwt_algorithm)
+    encoded_jwt = jwt.encode(to_encode, settings.jwt_token, algorithm=settings.jwt_algorithm)
     return encoded_jwt
 
 
@@ -99,9 +96,9 @@ async def registrate(email: str, hashed_password: str, db: Session):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
-async def login(user: UserInput, db: Session) -> Tokens:
+async def login(user: UserInput, db: Session, settings: Settings) -> Tokens:
     try:
-        librarian = db.query(Librarian).filter_by(email=user.email).first()
+        librarian = librarian_by_email(db, user.email)
         if not librarian:
             raise HTTPException(status_code=401, detail="Invalid email")
         
@@ -109,8 +106,8 @@ async def login(user: UserInput, db: Session) -> Tokens:
             raise HTTPException(status_code=401, detail="Invalid password")
         
         token_data = {"sub": user.email}
-        access_token = create_access_token(token_data)
-        refresh_token = create_refresh_token(token_data)
+        access_token = create_access_token(token_data, settings)
+        refresh_token = create_refresh_token(token_data, settings)
 
         os.makedirs("librarians_tokens", exist_ok=True)
         data = [{
@@ -134,14 +131,14 @@ async def user_registration_endpoint(user: UserInput, db: Session = Depends(get_
     return await registrate(user.email, hashed_password, db)
 
 @router.post("/librarians_login", response_model=Tokens)
-async def user_login_endpoint(user: UserInput, db: Session = Depends(get_db)):
-    return await login(user, db)
+async def user_login_endpoint(user: UserInput, db: Session = Depends(get_db), settings: Settings = Depends(app_settings)):
+    return await login(user, db, settings)
 
 @router.post("/refresh_token", response_model=Tokens)
-async def refresh_token_endpoint(token: str = Depends(oauth2_scheme)):
-    email = await get_current_user(token)
+async def refresh_token_endpoint(token: str = Depends(oauth2_scheme), settings: Settings = Depends(app_settings)):
+    email = await get_current_user(token, settings)
     token_data = {"sub": email}
-    new_access_token = create_access_token(token_data)
+    new_access_token = create_access_token(token_data, settings)
     os.makedirs("librarians_tokens", exist_ok=True)
     data = [{
         "user": email,
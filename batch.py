@@ -0,0 +1,201 @@
+import types
+import typing
+import inspect
+from functools import lru_cache
+from typing import Any, Annotated
+from urllib.parse import urlsplit, parse_qs
+
+from fastapi import Depends, HTTPException, APIRouter, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from pydantic.fields import FieldInfo
+from sqlalchemy.orm import Session
+
+from db import get_db_with_deadline
+from settings import Settings, app_settings
+from auth import verify_token
+from limits import admission, check_rate, POINT_COST
+from audit import AuditLog, app_audit_log, deferred
+from cache import ListingCache, app_listing_cache
+from idempotency import IdempotencyStore, app_idempotency_store
+from book_manage import router as book_manage_router
+from users_manage import router as user_manage_router
+from operations import router as operations_router
+from branches import router as branches_router
+from holds import router as holds_router
+
+router = APIRouter(dependencies=[Depends(admission)])
+
+MAX_BATCH_REQUESTS = 50
+BATCH_ROUTERS = [book_manage_router, user_manage_router, operations_router, branches_router, holds_router]
+# эти аргументы подзапросы получают от самого /batch
+SHARED_PARAMS = ("db", "current_user", "settings", "listing_cache", "audit_log", "idempotency_store")
+
+
+class SubRequest(BaseModel):
+    method: str
+    path: str
+    query: dict[str, Any] = Field(default_factory=dict)
+    body: dict[str, Any] | None = None
+
+class BatchInput(BaseModel):
+    requests: list[SubRequest] = Field(min_length=1, max_length=MAX_BATCH_REQUESTS)
+    atomic: bool = False
+
+
+@lru_cache(maxsize=None)
+def type_adapter(annotation, constraints: tuple = ()) -> TypeAdapter:
+    # ограничения Query/Path (ge, le, max_length) лежат в FieldInfo.metadata, без Annotated они теряются
+    return TypeAdapter(Annotated[annotation, *constraints] if constraints else annotation)
+
+def param_adapter(param: inspect.Parameter) -> TypeAdapter:
+    constraints = tuple(param.default.metadata) if isinstance(param.default, FieldInfo) else ()
+    return type_adapter(param.annotation, constraints)
+
+@lru_cache(maxsize=None)
+def is_list_annotation(annotation) -> bool:
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        return any(is_list_annotation(arg) for arg in typing.get_args(annotation))
+    return typing.get_origin(annotation) is list or annotation is list
+
+def resolve_route(method: str, path: str):
+    for batch_router in BATCH_ROUTERS:
+        for route in batch_router.routes:
+            if not isinstance(route, APIRoute) or method not in route.methods:
+                continue
+            match = route.path_regex.match(path)
+            if match:
+                path_params = {
+                    name: route.param_convertors[name].convert(value)
+                    for name, value in match.groupdict().items()
+                }
+                return route, path_params
+    raise HTTPException(status_code=404, detail=f"Route {method} {path} not found")
+
+def bind_arguments(route: APIRoute, path_params: dict, query: dict, body: dict | None, shared: dict):
+    # аргументы эндпоинта собираются так же, как их собрал бы FastAPI,
+    # но авторизация, сессия, настройки, кэш и журнал аудита берутся из самого /batch
+    kwargs = {}
+    for name, param in inspect.signature(route.endpoint).parameters.items():
+        annotation = param.annotation
+        if name in shared:
+            kwargs[name] = shared[name]
+        elif name in path_params:
+            # значения пути приходят строками, как и в обычном запросе они проверяются по аннотации
+            kwargs[name] = param_adapter(param).validate_python(path_params[name])
+        elif inspect.isclass(annotation) and issubclass(annotation, BaseModel):
+            kwargs[name] = annotation.model_validate(body or {})
+        elif name in query:
+            value = query[name]
+            # ?ids=5 - список из одного элемента, как и в обычном запросе
+            if is_list_annotation(annotation) and not isinstance(value, list):
+                value = [value]
+            kwargs[name] = param_adapter(param).validate_python(value)
+        elif isinstance(param.default, FieldInfo):
+            kwargs[name] = param.default.get_default(call_default_factory=True)
+        else:
+            kwargs[name] = param.default
+    return kwargs
+
+def warm_validators():
+    for batch_router in BATCH_ROUTERS:
+        for route in batch_router.routes:
+            for name, param in inspect.signature(route.endpoint).parameters.items():
+                annotation = param.annotation
+                if name in SHARED_PARAMS or annotation is inspect.Parameter.empty:
+                    continue
+                if not (inspect.isclass(annotation) and issubclass(annotation, BaseModel)):
+                    param_adapter(param)
+
+def split_path(sub: SubRequest):
+    parts = urlsplit(sub.path)
+    query = {
+        name: values if len(values) > 1 else values[0]
+        for name, values in parse_qs(parts.query).items()
+    }
+    query.update(sub.query)
+    return parts.path, query
+
+def route_cost(route: APIRoute, query: dict):
+    param = inspect.signature(route.endpoint).parameters.get("current_user")
+    cost = getattr(getattr(param, "default", None), "dependency", None)
+    cost = getattr(cost, "cost", POINT_COST)
+    return cost(query) if callable(cost) else cost
+
+def batch_cost(batch: BatchInput):
+    # подзапросы стоят столько же, сколько отдельные вызовы эндпоинтов
+    total = 0
+    for sub in batch.requests:
+        path, query = split_path(sub)
+        try:
+            route, _ = resolve_route(sub.method.upper(), path)
+        except HTTPException:
+            total += POINT_COST
+            continue
+        total += route_cost(route, query)
+    return total
+
+async def run_sub_request(sub: SubRequest, shared: dict):
+    try:
+        path, query = split_path(sub)
+        route, path_params = resolve_route(sub.method.upper(), path)
+        kwargs = bind_arguments(route, path_params, query, sub.body, shared)
+        result = await route.endpoint(**kwargs)
+        return {"status_code": 200, "body": jsonable_encoder(result)}
+    except HTTPException as e:
+        return {"status_code": e.status_code, "body": {"detail": e.detail}}
+    except ValidationError as e:
+        return {"status_code": 422, "body": {"detail": jsonable_encoder(e.errors(include_url=False))}}
+
+async def run_batch(batch: BatchInput, shared: dict):
+    db = shared["db"]
+    try:
+        if not batch.atomic:
+            responses = []
+            for sub in batch.requests:
+                response = await run_sub_request(sub, shared)
+                if response["status_code"] >= 400:
+                    db.rollback()
+                responses.append(response)
+            return {"committed": True, "responses": responses}
+
+        # all-or-nothing: подзапросы работают в сессии поверх внешней транзакции,
+        # их commit() только освобождает savepoint
+        session = Session(bind=db.connection(), join_transaction_mode="create_savepoint")
+        responses = []
+        failed = False
+        try:
+            # события аудита попадают в журнал, только если изменения закоммичены
+            with deferred() as audit_events:
+                for sub in batch.requests:
+                    if failed:
+                        responses.append({"status_code": 424, "body": {"detail": "Batch aborted"}})
+                        continue
+                    response = await run_sub_request(sub, {**shared, "db": session})
+                    failed = response["status_code"] >= 400
+                    responses.append(response)
+        finally:
+            session.close()
+        if failed:
+            db.rollback()
+        else:
+            db.commit()
+            await shared["audit_log"].record_many(audit_events)
+        return {"committed": not failed, "responses": responses}
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/batch", response_model=dict)
+async def batch_endpoint(request: Request, batch: BatchInput, current_user: str = Depends(verify_token), db: Session = Depends(get_db_with_deadline("listing_query_deadline")), settings: Settings = Depends(app_settings), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log), idempotency_store: IdempotencyStore = Depends(app_idempotency_store)):
+    # пачка списывается один раз - суммой стоимостей подзапросов
+    check_rate(request, current_user, batch_cost(batch))
+    shared = {
+        "db": db, "current_user": current_user, "settings": settings, "listing_cache": listing_cache,
+        "audit_log": audit_log, "idempotency_store": idempotency_store
+    }
+    return await run_batch(batch, shared)
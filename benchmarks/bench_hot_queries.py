@@ -0,0 +1,68 @@
+# процессорное время на один вызов запросов взятия/возврата: db.query(...) против queries.py
+#   python benchmarks/bench_hot_queries.py [--calls 20000]
+# используется временная sqlite бд, чтобы замер показывал затраты python, а не сети
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models import Base, Book, User, BorrowedBooks
+from queries import book_by_id, user_by_id, active_loan, active_loan_count
+
+
+def orm_queries(db: Session, book_id: int, user_id: int):
+    db.query(Book).filter(Book.id == book_id).first()
+    db.query(User).filter(User.id == user_id).first()
+    db.query(BorrowedBooks).filter(BorrowedBooks.user_id == user_id, BorrowedBooks.return_date == None).count()
+    db.query(BorrowedBooks).filter(
+        BorrowedBooks.user_id == user_id,
+        BorrowedBooks.book_id == book_id,
+        BorrowedBooks.return_date == None).first()
+
+def cached_queries(db: Session, book_id: int, user_id: int):
+    book_by_id(db, book_id)
+    user_by_id(db, user_id)
+    active_loan_count(db, user_id)
+    active_loan(db, user_id, book_id)
+
+def measure(db: Session, queries, calls: int, ids: list[tuple[int, int]]) -> float:
+    for book_id, user_id in ids[:100]:
+        queries(db, book_id, user_id)
+    started = time.process_time()
+    for i in range(calls):
+        book_id, user_id = ids[i % len(ids)]
+        queries(db, book_id, user_id)
+    return (time.process_time() - started) / calls
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all([Book(title=f"Book {i}", author="Author", date="2000", isbn=str(i), amount=5) for i in range(1000)])
+        db.add_all([User(name=f"User {i}", email=f"user{i}@example.com") for i in range(1000)])
+        db.commit()
+        db.add_all([BorrowedBooks(user_id=i + 1, book_id=i + 1, borrow_date=datetime.now()) for i in range(0, 1000, 2)])
+        db.commit()
+
+        ids = [(i % 1000 + 1, (i * 7) % 1000 + 1) for i in range(1000)]
+        for name, queries in (("db.query", orm_queries), ("queries.py", cached_queries)):
+            per_call = measure(db, queries, args.calls, ids)
+            print(f"{name:12} {per_call * 1e6:8.1f} us cpu per borrow lookup set "
+                  f"(~{1 / per_call:,.0f} sets/s per core)")
+
+
+if __name__ == "__main__":
+    main()
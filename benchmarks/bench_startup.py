@@ -0,0 +1,71 @@
+# холодный старт и задержка первого запроса:
+#   python benchmarks/bench_startup.py [--runs 5]
+# используется временная sqlite бд, чтобы замер не зависел от сети до postgres
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("JWT_TOKEN", "benchsecret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("JWT_ACCESS_TOKEN_EXPIRE", "30")
+os.environ.setdefault("JWT_REFRESH_TOKEN_EXPIRE", "60")
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def measure_import(runs: int):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+def measure_first_request(pool_warmup: int):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+
+    from main import create_app
+    from models import Base
+    from settings import get_settings
+    from auth import create_access_token
+
+    settings = get_settings().model_copy(update={"pool_warmup": pool_warmup})
+    Base.metadata.create_all(create_engine(settings.database_url))
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench@example.com'}, settings)}"}
+
+    started = time.perf_counter()
+    with TestClient(create_app(settings)) as client:
+        ready = time.perf_counter()
+        client.get("/book/get", params={"ids": [1]}, headers=headers)
+        first = time.perf_counter()
+        client.get("/book/get", params={"ids": [1]}, headers=headers)
+        second = time.perf_counter()
+    return ready - started, first - ready, second - first
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = measure_import(args.runs)
+    print(f"import main:            median {statistics.median(imports) * 1000:8.1f} ms  ({args.runs} runs)")
+    for pool_warmup in (0, 5):
+        startup, first, second = measure_first_request(pool_warmup)
+        print(f"pool_warmup={pool_warmup}: startup {startup * 1000:8.1f} ms, "
+              f"first request {first * 1000:8.1f} ms, second request {second * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
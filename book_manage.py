@@ -2,15 +2,21 @@ import os
 import json
 from typing import Optional
 
-from fastapi import Depends, HTTPException, APIRouter, Query
+from fastapi import Depends, HTTPException, APIRouter, Query, Header
 from pydantic import BaseModel, Field
+from sqlalchemy import select, exists, func
 from sqlalchemy.orm import Session
 
-from models import Book
-from db import get_db
-from auth import verify_token
+from models import Book, RelatedBook, BorrowedBooks, BranchStock, Hold
+from db import get_db_with_deadline, fetch_by_ids, MAX_BATCH_IDS, MAX_BULK_DELETE_IDS
+from limits import rate_limited, admission, listing_cost, POINT_COST, LISTING_COST
+from cache import ListingCache, app_listing_cache
+from audit import AuditLog, app_audit_log
+from idempotency import IdempotencyStore, app_idempotency_store, idempotent
+from purge import soft_delete_rows
+from queries import book_by_id, book_exists
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(admission)])
 
 class BookInput(BaseModel):
     title: str
@@ -26,12 +32,16 @@ class BookUpdate(BaseModel):
     isbn: Optional[str] = None
     amount: Optional[int] = None
 
+class BookBulkDelete(BaseModel):
+    ids: list[int] | None = Field(default=None, max_length=MAX_BULK_DELETE_IDS)
+    author: str | None = None
+    out_of_stock: bool = False
 
-async def create_new_book(book: BookInput, db: Session):
+
+async def create_new_book(book: BookInput, db: Session, listing_cache: ListingCache):
     try:
         # Проверка на существование книги
-        exists = db.query(Book).filter_by(title=book.title, author=book.author, date=book.date).count()
-        if exists > 0:
+        if book_exists(db, book.title, book.author, book.date):
             raise HTTPException(status_code=409, detail="Book already exists")
         
         # Создание новой книги
@@ -44,19 +54,45 @@ async def create_new_book(book: BookInput, db: Session):
         )
         db.add(new_book)
         db.commit()
+        listing_cache.invalidate("books")
         return {
             "status": "success",
-            "book": book.title
+            "book": book.title,
+            "book_id": new_book.id
             }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
-async def get_books(book_id: int, db: Session):
+def branch_amounts(db: Session, book_ids: list[int] | None = None) -> dict[int, int]:
+    # amount - общий фонд, экземпляры филиалов считаются отдельно одним запросом с GROUP BY
+    query = select(BranchStock.book_id, func.sum(BranchStock.amount)).group_by(BranchStock.book_id)
+    if book_ids is not None:
+        query = query.where(BranchStock.book_id.in_(book_ids))
+    return dict(db.execute(query).all())
+
+def load_all_books(db: Session):
+    books = db.query(Book).filter(Book.deleted_at.is_(None)).all()
+    in_branches = branch_amounts(db)
+    data = [{
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "date": book.date,
+        "isbn": book.isbn,
+        "amount": book.amount,
+        "branch_amount": in_branches.get(book.id, 0)
+    } for book in books]
+    os.makedirs("tables", exist_ok=True)
+    with open("tables/books.json", "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+    return data
+
+async def get_books(book_id: int, db: Session, listing_cache: ListingCache):
     try:
         if book_id is not None:
-            book = db.query(Book).filter(Book.id==book_id).first()
+            book = book_by_id(db, book_id)
             if not book:
                 raise HTTPException(status_code=404, detail="Book not found")
             data = [{
@@ -65,18 +101,11 @@ async def get_books(book_id: int, db: Session):
                 "author": book.author,
                 "date": book.date,
                 "isbn": book.isbn,
-                "amount": book.amount
+                "amount": book.amount,
+                "branch_amount": branch_amounts(db, [book.id]).get(book.id, 0)
             }]
         else:
-            books = db.query(Book).all()
-            data = [{
-                "id": book.id,
-                "title": book.title,
-                "author": book.author,
-                "date": book.date,
-                "isbn": book.isbn,
-                "amount": book.amount
-            } for book in books]
+            return await listing_cache.get("books", load_all_books, db)
         os.makedirs("tables", exist_ok=True)
         with open("tables/books.json", "w", encoding="utf-8") as file:
             json.dump(data, file, ensure_ascii=False, indent=2)
@@ -85,9 +114,55 @@ async def get_books(book_id: int, db: Session):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
-async def update_book(book_id: int, book_data: BookUpdate, db: Session):
+async def get_books_by_ids(ids: list[int], db: Session):
+    try:
+        if len(ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_BATCH_IDS})")
+        books, missing = fetch_by_ids(db, Book, ids)
+        in_branches = branch_amounts(db, [book.id for book in books])
+        data = [{
+            "id": book.id,
+            "title": book.title,
+            "author": book.author,
+            "date": book.date,
+            "isbn": book.isbn,
+            "amount": book.amount,
+            "branch_amount": in_branches.get(book.id, 0)
+        } for book in books]
+        return {
+            "books": data,
+            "missing": missing
+            }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+async def get_related_books(book_id: int, db: Session):
+    try:
+        related = (
+            db.query(RelatedBook, Book)
+            .join(Book, Book.id == RelatedBook.related_book_id)
+            .filter(RelatedBook.book_id == book_id, Book.deleted_at.is_(None))
+            .order_by(RelatedBook.rank)
+            .all()
+        )
+        if not related and not book_by_id(db, book_id):
+            raise HTTPException(status_code=404, detail="Book not found")
+        return [{
+            "id": book.id,
+            "title": book.title,
+            "author": book.author,
+            "score": link.score
+        } for link, book in related]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+async def update_book(book_id: int, book_data: BookUpdate, db: Session, listing_cache: ListingCache):
     try:
-        book = db.query(Book).filter(Book.id == book_id).first()
+        book = book_by_id(db, book_id)
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
         
@@ -109,6 +184,7 @@ async def update_book(book_id: int, book_data: BookUpdate, db: Session):
             book.isbn = book_data.isbn
 
         db.commit()
+        listing_cache.invalidate("books")
         return {
             "status": "success", 
             "book_id": book.id
@@ -118,14 +194,19 @@ async def update_book(book_id: int, book_data: BookUpdate, db: Session):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-async def delete_book(book_id: int, db: Session):
+async def delete_book(book_id: int, db: Session, listing_cache: ListingCache):
     try:
-        book = db.query(Book).filter_by(id=book_id).first()
+        book = book_by_id(db, book_id)
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
         
-        db.delete(book)
+        _, skipped, missing = soft_delete_rows(db, Book, BorrowedBooks.book_id, Hold.book_id, [book.id])
+        if missing:
+            raise HTTPException(status_code=404, detail="Book not found")
+        if skipped:
+            raise HTTPException(status_code=409, detail="Book has active loans")
         db.commit()
+        listing_cache.invalidate("books")
         return {
             "status": "success",
             "book_id": book.id
@@ -135,15 +216,69 @@ async def delete_book(book_id: int, db: Session):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def delete_books(criteria: BookBulkDelete, db: Session, listing_cache: ListingCache):
+    try:
+        if not (criteria.ids or criteria.author or criteria.out_of_stock):
+            raise HTTPException(status_code=400, detail="Specify ids or a filter")
+        query = select(Book.id).where(Book.deleted_at.is_(None))
+        if criteria.ids:
+            query = query.where(Book.id.in_(criteria.ids))
+        if criteria.author:
+            query = query.where(Book.author == criteria.author)
+        if criteria.out_of_stock:
+            # нет ни в общем фонде, ни в филиалах
+            query = query.where(
+                Book.amount == 0,
+                ~exists().where(BranchStock.book_id == Book.id, BranchStock.amount > 0)
+            )
+        ids = db.scalars(query.order_by(Book.id)).all()
+        deleted, skipped, missing = soft_delete_rows(db, Book, BorrowedBooks.book_id, Hold.book_id, ids)
+        if criteria.ids:
+            # как в fetch_by_ids: запрошенные id, которых нет, которые уже удалены или не подошли под фильтр
+            found = set(ids)
+            missing += [i for i in dict.fromkeys(criteria.ids) if i not in found]
+        db.commit()
+        listing_cache.invalidate("books")
+        return {
+            "status": "success",
+            "deleted": deleted,
+            "skipped": skipped,
+            "missing": missing
+            }
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @router.post("/book/create", response_model=dict)
-async def book_create_endpoint(book: BookInput, current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
-    return await create_new_book(book, db)
-@router.get("/book/get", response_model=list)
-async def book_get_endpoint(book_id: int | None = Query(default=None), current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
-    return await get_books(book_id, db)
+async def book_create_endpoint(book: BookInput, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log), idempotency_store: IdempotencyStore = Depends(app_idempotency_store), idempotency_key: str | None = Header(default=None)):
+    async def create(db: Session):
+        result = await create_new_book(book, db, listing_cache)
+        await audit_log.record(current_user, "create", "book", result["book_id"])
+        return result
+    return await idempotent(idempotency_key, current_user, "book_create", book, db, idempotency_store, audit_log, create)
+@router.get("/book/get", response_model=list | dict)
+async def book_get_endpoint(book_id: int | None = Query(default=None), ids: list[int] | None = Query(default=None), current_user: str = Depends(rate_limited(listing_cost("book_id", "ids"))), db: Session = Depends(get_db_with_deadline("listing_query_deadline")), listing_cache: ListingCache = Depends(app_listing_cache)):
+    if ids:
+        return await get_books_by_ids(ids, db)
+    return await get_books(book_id, db, listing_cache)
+@router.get("/book/{book_id}/related", response_model=list)
+async def book_related_endpoint(book_id: int, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline"))):
+    return await get_related_books(book_id, db)
 @router.put("/book/update/{book_id}", response_model=dict)
-async def book_update_endpoint(book_id: int, book_data: BookUpdate, current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
-    return await update_book(book_id, book_data, db)
+async def book_update_endpoint(book_id: int, book_data: BookUpdate, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await update_book(book_id, book_data, db, listing_cache)
+    await audit_log.record(current_user, "update", "book", book_id)
+    return result
 @router.delete("/book/delete/{book_id}", response_model=dict)
-async def book_delete_endpoint(book_id: int, current_user: str = Depends(verify_token),db: Session = Depends(get_db)):
-    return await delete_book(book_id, db)
+async def book_delete_endpoint(book_id: int, current_user: str = Depends(rate_limited(POINT_COST)),db: Session = Depends(get_db_with_deadline("query_deadline")), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await delete_book(book_id, db, listing_cache)
+    await audit_log.record(current_user, "delete", "book", book_id)
+    return result
+@router.post("/book/delete_bulk", response_model=dict)
+async def book_delete_bulk_endpoint(criteria: BookBulkDelete, current_user: str = Depends(rate_limited(LISTING_COST)), db: Session = Depends(get_db_with_deadline("listing_query_deadline")), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await delete_books(criteria, db, listing_cache)
+    for book_id in result["deleted"]:
+        await audit_log.record(current_user, "delete", "book", book_id)
+    return result
@@ -0,0 +1,128 @@
+from fastapi import Depends, HTTPException, APIRouter
+from pydantic import BaseModel, Field
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import Branch, BranchStock
+from db import get_db_with_deadline
+from limits import rate_limited, admission, POINT_COST
+from audit import AuditLog, app_audit_log
+from cache import ListingCache, app_listing_cache
+from queries import book_by_id
+
+router = APIRouter(dependencies=[Depends(admission)])
+
+class BranchInput(BaseModel):
+    name: str
+
+class BranchStockInput(BaseModel):
+    book_id: int = Field(ge=0)
+    branch_id: int = Field(ge=0)
+    amount: int = Field(ge=0, le=100)
+
+
+# выдача и возврат меняют только строку (book_id, branch_id), общий счетчик книги не блокируется
+def take_branch_copy(book_id: int, branch_id: int, db: Session):
+    taken = db.execute(
+        update(BranchStock)
+        .where(BranchStock.book_id == book_id, BranchStock.branch_id == branch_id, BranchStock.amount > 0)
+        .values(amount=BranchStock.amount - 1)
+    ).rowcount
+    if not taken:
+        if not db.get(Branch, branch_id):
+            raise HTTPException(status_code=404, detail="Branch not found")
+        raise HTTPException(status_code=400, detail="Book is not available at this branch")
+
+def put_branch_copy(book_id: int, branch_id: int, db: Session):
+    returned = db.execute(
+        update(BranchStock)
+        .where(BranchStock.book_id == book_id, BranchStock.branch_id == branch_id)
+        .values(amount=BranchStock.amount + 1)
+    ).rowcount
+    if not returned:
+        if not db.get(Branch, branch_id):
+            raise HTTPException(status_code=404, detail="Branch not found")
+        db.add(BranchStock(book_id=book_id, branch_id=branch_id, amount=1))
+
+
+async def create_branch(branch: BranchInput, db: Session):
+    try:
+        exists = db.query(Branch).filter_by(name=branch.name).count()
+        if exists > 0:
+            raise HTTPException(status_code=409, detail="Branch already exists")
+        new_branch = Branch(name=branch.name)
+        db.add(new_branch)
+        db.commit()
+        return {"status": "success", "branch_id": new_branch.id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+async def get_branches(db: Session):
+    try:
+        branches = db.query(Branch).order_by(Branch.id).all()
+        return [{"id": branch.id, "name": branch.name} for branch in branches]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+async def set_branch_stock(stock: BranchStockInput, db: Session, listing_cache: ListingCache):
+    try:
+        if not book_by_id(db, stock.book_id):
+            raise HTTPException(status_code=404, detail="Book not found")
+        if not db.get(Branch, stock.branch_id):
+            raise HTTPException(status_code=404, detail="Branch not found")
+        row = db.get(BranchStock, (stock.book_id, stock.branch_id))
+        if row:
+            row.amount = stock.amount
+        else:
+            db.add(BranchStock(book_id=stock.book_id, branch_id=stock.branch_id, amount=stock.amount))
+        db.commit()
+        listing_cache.invalidate("books")
+        return {"status": "success", "book_id": stock.book_id, "branch_id": stock.branch_id, "amount": stock.amount}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+async def get_availability(book_id: int, db: Session):
+    try:
+        book = book_by_id(db, book_id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        stock = (
+            db.query(BranchStock.branch_id, Branch.name, BranchStock.amount)
+            .join(Branch, Branch.id == BranchStock.branch_id)
+            .filter(BranchStock.book_id == book_id)
+            .order_by(BranchStock.branch_id)
+            .all()
+        )
+        branches = [{"branch_id": branch_id, "name": name, "amount": amount} for branch_id, name, amount in stock]
+        return {
+            "book_id": book_id,
+            "unassigned": book.amount,
+            "branches": branches,
+            "total": book.amount + sum(branch["amount"] for branch in branches)
+            }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+@router.post("/branch/create", response_model=dict)
+async def branch_create_endpoint(branch: BranchInput, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await create_branch(branch, db)
+    await audit_log.record(current_user, "create", "branch", result["branch_id"])
+    return result
+@router.get("/branch/get", response_model=list)
+async def branch_get_endpoint(current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline"))):
+    return await get_branches(db)
+@router.put("/branch/stock", response_model=dict)
+async def branch_stock_endpoint(stock: BranchStockInput, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await set_branch_stock(stock, db, listing_cache)
+    await audit_log.record(current_user, "restock", "book", stock.book_id)
+    return result
+@router.get("/book/{book_id}/availability", response_model=dict)
+async def book_availability_endpoint(book_id: int, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline"))):
+    return await get_availability(book_id, db)
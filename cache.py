@@ -0,0 +1,118 @@
+import time
+import asyncio
+import logging
+
+from fastapi import Request
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from db import apply_deadline, cancel_query, wait_for_disconnect
+
+logger = logging.getLogger(__name__)
+
+
+def load_in_session(loader, bind, deadline: float, state: dict):
+    if state.get("cancelled"):
+        raise RuntimeError("listing load cancelled")
+    with Session(bind=bind) as session:
+        apply_deadline(session, deadline, state)
+        return loader(session)
+
+
+# одновременные одинаковые запросы списков разделяют одно выполнение запроса к бд;
+# в течение ttl результат отдается как есть, еще stale_ttl секунд - отдается устаревший,
+# пока в фоне идет одно обновление. операции записи вызывают invalidate
+class ListingCache:
+    def __init__(self, ttl: float = 2, stale_ttl: float = 30, deadline: float = 30):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.deadline = deadline
+        self.entries = {}
+        self.in_flight = {}
+        self.generations = {}
+        # для каждой загрузки: соединение (для отмены) и число клиентов, которые ее ждут
+        self.queries = {}
+        self.waiters = {}
+
+    async def get(self, key: str, loader, db: Session):
+        bind = db.get_bind()
+        if not isinstance(bind, Engine):
+            # сессия внутри внешней транзакции (atomic /batch) может видеть
+            # незакоммиченные данные, их нельзя отдавать другим запросам
+            return loader(db)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            loaded_at, data = entry
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                return data
+            if age < self.ttl + self.stale_ttl:
+                if key not in self.in_flight:
+                    self.start_load(key, loader, bind)
+                return data
+
+        task = self.in_flight.get(key)
+        if task is None:
+            task = self.start_load(key, loader, bind)
+        request = db.info.get("request")
+        if request is None:
+            return await asyncio.shield(task)
+        return await self.wait(key, task, request)
+
+    async def wait(self, key: str, task: asyncio.Task, request):
+        # общая загрузка отменяется (вместе с запросом в бд), только когда ушли все клиенты, которые ее ждут
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        disconnect = asyncio.create_task(wait_for_disconnect(request))
+        try:
+            await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnect.cancel()
+            self.waiters[task] -= 1
+            left = self.waiters[task]
+            if not left:
+                del self.waiters[task]
+        if task.done():
+            return task.result()
+        if not left:
+            if self.in_flight.get(key) is task:
+                del self.in_flight[key]
+            cancel_query(self.queries[task])
+        raise asyncio.CancelledError()
+
+    def start_load(self, key: str, loader, bind):
+        generation = self.generations.get(key, 0)
+        state = {}
+        task = asyncio.create_task(run_in_threadpool(load_in_session, loader, bind, self.deadline, state))
+        self.in_flight[key] = task
+        self.queries[task] = state
+
+        def store(done: asyncio.Task):
+            self.queries.pop(done, None)
+            if self.in_flight.get(key) is done:
+                del self.in_flight[key]
+            if done.cancelled():
+                return
+            if done.exception() is not None:
+                logger.warning("listing %s refresh failed: %s", key, done.exception())
+                return
+            if self.generations.get(key, 0) == generation:
+                self.entries[key] = (time.monotonic(), done.result())
+
+        task.add_done_callback(store)
+        return task
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            self.entries.pop(key, None)
+            self.in_flight.pop(key, None)
+
+    def clear(self):
+        self.invalidate(*set(self.entries) | set(self.in_flight))
+
+
+# у каждого приложения свой кэш в app.state (создается в create_app в main.py)
+def app_listing_cache(request: Request) -> ListingCache:
+    return request.app.state.listing_cache
@@ -0,0 +1,202 @@
+import zlib
+import hashlib
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MINIMUM_SIZE = 1024
+CACHE_SIZE = 64
+# большие повторяющиеся списки: сжатые байты переиспользуются, пока тело ответа не изменилось.
+# эндпоинт и сериализация выполняются на каждый запрос (данные берутся из listing_cache),
+# кэш экономит только повторное сжатие, а 304 - только передачу тела
+CACHEABLE_PATHS = {"/book/get", "/user/get", "/operation/get_all_borrowed_books"}
+
+
+class GzipEncoder:
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+class BrotliEncoder:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+class ZstdEncoder:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+# в порядке предпочтения сервера
+ENCODERS = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+ENCODERS["gzip"] = GzipEncoder
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODERS:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE, cache_size: int = CACHE_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressedResponder(self, scope, request_headers, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def cached(self, key, digest: str):
+        entry = self.cache.get(key)
+        if entry is None or entry[0] != digest:
+            return None
+        self.cache.move_to_end(key)
+        return entry[1]
+
+    def store(self, key, digest: str, body: bytes):
+        self.cache[key] = (digest, body)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+
+class CompressedResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope, request_headers: Headers, encoding: str, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.request_headers = request_headers
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+        self.pending = b""
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = "content-encoding" in Headers(raw=message["headers"])
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self.downstream(self.start_message)
+                self.start_message = None
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            # начало потокового ответа копится до minimum_size: короткий поток уходит как обычный ответ
+            self.pending += body
+            if not more_body:
+                await self.send_complete(self.pending)
+                return
+            if len(self.pending) < self.middleware.minimum_size:
+                return
+            # потоковый ответ: сжимается по частям, длина заранее неизвестна
+            self.encoder = ENCODERS[self.encoding]()
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            del headers["content-length"]
+            headers["content-encoding"] = self.encoding
+            headers.add_vary_header("accept-encoding")
+            await self.downstream(self.start_message)
+            await self.downstream({"type": "http.response.body", "body": self.encoder.compress(self.pending), "more_body": True})
+            self.pending = b""
+        else:
+            chunk = self.encoder.compress(body)
+            if not more_body:
+                chunk += self.encoder.flush()
+            await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def send_complete(self, body: bytes):
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        if len(body) < self.middleware.minimum_size:
+            await self.downstream(self.start_message)
+            await self.downstream({"type": "http.response.body", "body": body})
+            return
+
+        compressed = None
+        cacheable = (
+            self.scope["method"] == "GET"
+            and self.scope["path"] in CACHEABLE_PATHS
+            and self.start_message["status"] == 200
+        )
+        if cacheable:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            etag = f'"{digest}-{self.encoding}"'
+            headers["etag"] = etag
+            headers.add_vary_header("accept-encoding")
+            if self.request_headers.get("if-none-match") == etag:
+                del headers["content-length"]
+                await self.downstream({**self.start_message, "status": 304})
+                await self.downstream({"type": "http.response.body", "body": b""})
+                return
+            key = (self.scope["path"], self.scope["query_string"], self.encoding)
+            compressed = self.middleware.cached(key, digest)
+            if compressed is None:
+                compressed = self.compress(body)
+                self.middleware.store(key, digest, compressed)
+        else:
+            compressed = self.compress(body)
+
+        headers["content-encoding"] = self.encoding
+        headers["content-length"] = str(len(compressed))
+        headers.add_vary_header("accept-encoding")
+        await self.downstream(self.start_message)
+        await self.downstream({"type": "http.response.body", "body": compressed})
+
+    def compress(self, body: bytes) -> bytes:
+        encoder = ENCODERS[self.encoding]()
+        return encoder.compress(body) + encoder.flush()
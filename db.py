@@ -1,23 +1,129 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
 
-load_dotenv()
-user = os.getenv("POSTGRES_USER")
-password = os.getenv("POSTGRES_PASSWORD")
-database = os.getenv("POSTGRES_DATABASE")
-host = os.getenv("POSTGRES_HOST")
-port = os.getenv("POSTGRES_PORT")
+from settings import Settings, app_settings
 
-DATABASE_URL = f"postgresql://{user}:{password}@{host}:{port}/{database}"
+QUERY_CANCELED_PGCODE = "57014"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def create_db_engine(settings: Settings):
+    url = make_url(settings.database_url)
+    if url.get_backend_name() == "sqlite":
+        engine_options = {"connect_args": {"check_same_thread": False}}
+    else:
+        engine_options = {
+            "pool_size": settings.pool_size,
+            "max_overflow": settings.max_overflow,
+            "pool_timeout": settings.pool_timeout,
+            "pool_pre_ping": True,
+        }
+    return create_engine(url, **engine_options)
 
-def get_db():
-    db = SessionLocal()
+def make_sessionmaker(engine):
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+def warm_pool(engine, connections: int):
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            connection.exec_driver_sql("SELECT 1")
+            opened.append(connection)
+    finally:
+        for connection in opened:
+            connection.close()
+
+# у каждого приложения свой движок и sessionmaker в app.state (создаются в lifespan в main.py)
+def get_db(request: Request):
+    db = request.app.state.sessionmaker()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# cli-задачи (archive, purge, overdue, ...) работают вне приложения: движок процесса создается через init_engine
+engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+def init_engine(settings: Settings):
+    global engine
+    engine = create_db_engine(settings)
+    SessionLocal.configure(bind=engine)
+    return engine
+
+def dispose_engine():
+    global engine
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
+MAX_BATCH_IDS = 100
+MAX_BULK_DELETE_IDS = 1000
+
+def fetch_by_ids(db, model, ids: list[int]):
+    # один запрос через IN, порядок как в запросе, дубликаты отбрасываются; удаленные строки - как отсутствующие
+    unique_ids = list(dict.fromkeys(ids))
+    query = db.query(model).filter(model.id.in_(unique_ids))
+    if hasattr(model, "deleted_at"):
+        query = query.filter(model.deleted_at.is_(None))
+    rows = query.all()
+    by_id = {row.id: row for row in rows}
+    found = [by_id[i] for i in unique_ids if i in by_id]
+    missing = [i for i in unique_ids if i not in by_id]
+    return found, missing
+
+
+def apply_deadline(db: Session, seconds: float, state: dict | None = None):
+    # SET LOCAL действует до конца транзакции, поэтому выставляется в начале каждой
+    timeout_ms = int(seconds * 1000)
+
+    def after_begin(session, transaction, connection):
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+        if state is not None:
+            state["dbapi_connection"] = connection.connection.dbapi_connection
+
+    event.listen(db, "after_begin", after_begin)
+    return after_begin
+
+def find_db_error(exc: BaseException):
+    while exc is not None:
+        if isinstance(exc, (DBAPIError, PoolTimeoutError)):
+            return exc
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+def cancel_query(state: dict):
+    # отмена выполняющегося запроса из другого потока: psycopg2 - cancel(), sqlite3 - interrupt()
+    state["cancelled"] = True
+    dbapi_connection = state.get("dbapi_connection")
+    cancel = getattr(dbapi_connection, "cancel", None) or getattr(dbapi_connection, "interrupt", None)
+    if cancel is not None:
+        cancel()
+
+async def wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+def get_db_with_deadline(deadline_setting: str):
+    # запрос ограничен statement_timeout; полные списки выполняются вне event loop (cache.py)
+    # и отменяются, если клиент ушел (запрос берется из db.info["request"])
+    async def dependency(request: Request, db: Session = Depends(get_db), settings: Settings = Depends(app_settings)):
+        listener = apply_deadline(db, getattr(settings, deadline_setting))
+        db.info["request"] = request
+        try:
+            yield db
+        except HTTPException as e:
+            error = find_db_error(e)
+            if isinstance(error, PoolTimeoutError):
+                raise HTTPException(status_code=503, detail="Database is busy", headers={"Retry-After": "1"}) from e
+            if isinstance(error, DBAPIError) and getattr(error.orig, "pgcode", None) == QUERY_CANCELED_PGCODE:
+                raise HTTPException(status_code=504, detail="Query deadline exceeded") from e
+            raise
+        finally:
+            db.info.pop("request", None)
+            event.remove(db, "after_begin", listener)
+    return dependency
@@ -0,0 +1,220 @@
+# колоночный снимок library, users и borrowed_books (вместе с архивом) для аналитики:
+#   python export.py --out snapshots/2026-10-19 [--format auto|arrow|numpy] [--chunk-size 50000]
+# arrow: <out>/<table>.arrow (Arrow IPC, если установлен pyarrow)
+# numpy: <out>/<table>/<column>.npy, строки без NULL (пустая строка), целые без NULL (-1), даты с NaT
+# оба формата открываются через memory map, см. load_snapshot
+import os
+import json
+import argparse
+
+import numpy as np
+from sqlalchemy import select, func, DateTime, Integer, Float
+from sqlalchemy.orm import Session
+
+import db
+from models import Book, User, BorrowedBooks, ArchivedBorrowedBooks
+from settings import get_settings
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+EXPORT_CHUNK_SIZE = 50000
+DATASETS = {
+    "library": [Book.__table__],
+    "users": [User.__table__],
+    "borrowed_books": [BorrowedBooks.__table__, ArchivedBorrowedBooks.__table__],
+}
+
+
+def dataset_columns(tables) -> list:
+    names = set.intersection(*[set(table.columns.keys()) for table in tables])
+    return [column for column in tables[0].columns if column.name in names]
+
+def column_kind(column) -> str:
+    if isinstance(column.type, DateTime):
+        return "datetime"
+    if isinstance(column.type, Integer):
+        return "int"
+    if isinstance(column.type, Float):
+        return "float"
+    return "str"
+
+def numpy_dtype(db_session: Session, tables, column) -> str:
+    kind = column_kind(column)
+    if kind == "datetime":
+        return "datetime64[us]"
+    if kind == "int":
+        return "int64"
+    if kind == "float":
+        return "float64"
+    width = column.type.length
+    if width is None:
+        width = max(
+            db_session.scalar(select(func.max(func.length(table.c[column.name])))) or 0
+            for table in tables
+        )
+    return f"<U{max(width, 1)}"
+
+def arrow_type(column):
+    return {
+        "datetime": pa.timestamp("us"),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "str": pa.string(),
+    }[column_kind(column)]
+
+def stream_rows(db_session: Session, tables, columns, chunk_size: int):
+    for table in tables:
+        result = db_session.execute(
+            select(*[table.c[column.name] for column in columns])
+            .order_by(table.c.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for partition in result.partitions():
+            yield partition
+
+def resize_memmap(path: str, array: np.memmap, rows: int, dtype=None) -> np.memmap:
+    # файл пересоздается с новой длиной (или шириной строк), уже записанные значения копируются
+    resized = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=dtype or array.dtype, shape=(rows,))
+    keep = min(rows, len(array))
+    resized[:keep] = array[:keep]
+    resized.flush()
+    os.replace(path + ".tmp", path)
+    return resized
+
+def export_numpy(db_session: Session, out_dir: str, name: str, tables, chunk_size: int):
+    # размеры берутся из COUNT(*) и max(length) заранее; без общего снимка (не postgres) строки могут
+    # добавиться или удалиться до чтения, поэтому файлы подгоняются под фактически прочитанное
+    columns = dataset_columns(tables)
+    rows = sum(db_session.scalar(select(func.count()).select_from(table)) for table in tables)
+    dataset_dir = os.path.join(out_dir, name)
+    os.makedirs(dataset_dir, exist_ok=True)
+    paths = {column.name: os.path.join(dataset_dir, f"{column.name}.npy") for column in columns}
+    arrays = {
+        column.name: np.lib.format.open_memmap(
+            paths[column.name], mode="w+",
+            dtype=numpy_dtype(db_session, tables, column), shape=(rows,)
+        )
+        for column in columns
+    }
+    written = 0
+    for partition in stream_rows(db_session, tables, columns, chunk_size):
+        values = list(zip(*partition))
+        end = written + len(partition)
+        if end > rows:
+            rows = max(end, 2 * rows)
+            arrays = {column: resize_memmap(paths[column], array, rows) for column, array in arrays.items()}
+        for column, column_values in zip(columns, values):
+            array = arrays[column.name]
+            if column_kind(column) == "str":
+                column_values = ["" if value is None else value for value in column_values]
+                width = max(map(len, column_values), default=0)
+                if width > array.dtype.itemsize // 4:
+                    array = arrays[column.name] = resize_memmap(paths[column.name], array, rows, f"<U{width}")
+            elif column_kind(column) == "int":
+                column_values = [-1 if value is None else value for value in column_values]
+            array[written:end] = np.array(column_values, dtype=array.dtype)
+        written = end
+    if written != rows:
+        arrays = {column: resize_memmap(paths[column], array, written) for column, array in arrays.items()}
+    for array in arrays.values():
+        array.flush()
+    return {"format": "numpy", "rows": written, "columns": {name: str(array.dtype) for name, array in arrays.items()}}
+
+def export_arrow(db_session: Session, out_dir: str, name: str, tables, chunk_size: int):
+    columns = dataset_columns(tables)
+    schema = pa.schema([(column.name, arrow_type(column)) for column in columns])
+    written = 0
+    with pa.OSFile(os.path.join(out_dir, f"{name}.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for partition in stream_rows(db_session, tables, columns, chunk_size):
+                values = list(zip(*partition))
+                writer.write_batch(pa.record_batch(
+                    [pa.array(column_values, type=field.type) for column_values, field in zip(values, schema)],
+                    schema=schema
+                ))
+                written += len(partition)
+    return {"format": "arrow", "rows": written, "columns": {field.name: str(field.type) for field in schema}}
+
+def load_snapshot(out_dir: str) -> dict[str, dict[str, np.ndarray]]:
+    with open(os.path.join(out_dir, "manifest.json"), encoding="utf-8") as file:
+        manifest = json.load(file)
+    snapshot = {}
+    for name, meta in manifest["datasets"].items():
+        if meta["format"] == "arrow":
+            table = pa.ipc.open_file(pa.memory_map(os.path.join(out_dir, f"{name}.arrow"))).read_all()
+            snapshot[name] = {
+                column: table.column(column).to_numpy(zero_copy_only=False)
+                for column in meta["columns"]
+            }
+        else:
+            snapshot[name] = {
+                column: np.load(os.path.join(out_dir, name, f"{column}.npy"), mmap_mode="r")
+                for column in meta["columns"]
+            }
+    return snapshot
+
+def summarize_loans(loans: dict[str, np.ndarray]) -> dict:
+    borrow_date = loans["borrow_date"].astype("datetime64[us]")
+    return_date = loans["return_date"].astype("datetime64[us]")
+    returned = ~np.isnat(return_date)
+    durations = (return_date[returned] - borrow_date[returned]) / np.timedelta64(1, "D")
+
+    months, per_month = np.unique(borrow_date.astype("datetime64[M]"), return_counts=True)
+    books, per_book = np.unique(loans["book_id"], return_counts=True)
+    top = np.argsort(-per_book, kind="stable")[:10]
+    return {
+        "loans": int(len(borrow_date)),
+        "active_loans": int((~returned).sum()),
+        "readers": int(len(np.unique(loans["user_id"]))),
+        "mean_loan_days": float(durations.mean()) if len(durations) else None,
+        "median_loan_days": float(np.median(durations)) if len(durations) else None,
+        "loans_per_month": {str(month): int(count) for month, count in zip(months, per_month)},
+        "top_books": [{"book_id": int(books[i]), "loans": int(per_book[i])} for i in top],
+    }
+
+def export_snapshot(db_session: Session, out_dir: str, export_format: str = "auto",
+                    chunk_size: int = EXPORT_CHUNK_SIZE) -> dict:
+    if export_format == "auto":
+        export_format = "arrow" if pa is not None else "numpy"
+    if export_format == "arrow" and pa is None:
+        raise RuntimeError("pyarrow is not installed, use --format numpy")
+    if db_session.get_bind().dialect.name == "postgresql":
+        # все таблицы читаются из одного снимка бд
+        db_session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+    os.makedirs(out_dir, exist_ok=True)
+    export = export_arrow if export_format == "arrow" else export_numpy
+    manifest = {"datasets": {
+        name: export(db_session, out_dir, name, tables, chunk_size)
+        for name, tables in DATASETS.items()
+    }}
+    db_session.rollback()
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+
+    summary = summarize_loans(load_snapshot(out_dir)["borrowed_books"])
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as file:
+        json.dump(summary, file, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export library, users and borrowed_books to a columnar snapshot")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--format", choices=["auto", "arrow", "numpy"], default="auto")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db.init_engine(get_settings())
+    with db.SessionLocal() as db_session:
+        manifest = export_snapshot(db_session, args.out, args.format, args.chunk_size)
+    db.dispose_engine()
+    for name, meta in manifest["datasets"].items():
+        print(f"{name}: {meta['rows']} rows ({meta['format']})")
+
+
+if __name__ == "__main__":
+    main()
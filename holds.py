@@ -0,0 +1,98 @@
+from datetime import datetime
+
+from fastapi import Depends, HTTPException, APIRouter
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from models import Hold, BranchStock
+from db import get_db_with_deadline
+from limits import rate_limited, admission, POINT_COST
+from audit import AuditLog, app_audit_log
+from queries import book_by_id, user_by_id, active_loan, pending_hold, hold_position
+
+router = APIRouter(dependencies=[Depends(admission)])
+
+class HoldInput(BaseModel):
+    book_id: int = Field(ge=0)
+    user_id: int = Field(ge=0)
+
+
+def hold_status(hold: Hold, db: Session):
+    data = {
+        "hold_id": hold.id,
+        "book_id": hold.book_id,
+        "user_id": hold.user_id,
+        "created_at": hold.created_at,
+        "status": "fulfilled" if hold.fulfilled_at else "waiting"
+    }
+    if hold.fulfilled_at:
+        data["loan_id"] = hold.loan_id
+    else:
+        data["position"] = hold_position(db, hold)
+    return data
+
+async def place_hold(book_id: int, user_id: int, db: Session):
+    try:
+        book = book_by_id(db, book_id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        if not user_by_id(db, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        if active_loan(db, user_id, book_id):
+            raise HTTPException(status_code=409, detail="User already has this book")
+        if pending_hold(db, user_id, book_id):
+            raise HTTPException(status_code=409, detail="User is already waiting for this book")
+        # в очередь встают только за книгой, которой нет ни в фонде, ни в одном филиале (как в /book/{id}/availability)
+        in_branches = db.query(BranchStock).filter(BranchStock.book_id == book_id, BranchStock.amount > 0).count()
+        if book.amount > 0 or in_branches:
+            raise HTTPException(status_code=409, detail="Book is available, borrow it instead")
+
+        hold = Hold(book_id=book_id, user_id=user_id, created_at=datetime.now())
+        db.add(hold)
+        db.commit()
+        return hold_status(hold, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+async def get_hold(hold_id: int, db: Session):
+    try:
+        hold = db.get(Hold, hold_id)
+        if not hold:
+            raise HTTPException(status_code=404, detail="Hold not found")
+        return hold_status(hold, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+async def cancel_hold(hold_id: int, db: Session):
+    try:
+        hold = db.get(Hold, hold_id)
+        if not hold:
+            raise HTTPException(status_code=404, detail="Hold not found")
+        if hold.fulfilled_at:
+            raise HTTPException(status_code=400, detail="Hold was already fulfilled")
+        db.delete(hold)
+        db.commit()
+        return {"status": "success", "hold_id": hold_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/hold/place", response_model=dict)
+async def hold_place_endpoint(input_data: HoldInput, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await place_hold(input_data.book_id, input_data.user_id, db)
+    await audit_log.record(current_user, "create", "hold", result["hold_id"])
+    return result
+@router.get("/hold/{hold_id}", response_model=dict)
+async def hold_get_endpoint(hold_id: int, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline"))):
+    return await get_hold(hold_id, db)
+@router.delete("/hold/cancel/{hold_id}", response_model=dict)
+async def hold_cancel_endpoint(hold_id: int, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await cancel_hold(hold_id, db)
+    await audit_log.record(current_user, "delete", "hold", hold_id)
+    return result
@@ -0,0 +1,185 @@
+# повтор записи с тем же Idempotency-Key возвращает первый ответ и не выполняет операцию снова:
+# ответы хранятся в памяти (ограниченное число ключей, TTL) и, при IDEMPOTENCY_PERSIST=true,
+# в таблице idempotency_keys, чтобы повтор, пришедший в другой процесс, стоил одно чтение.
+# очистка устаревших строк таблицы (удобно запускать из cron):
+#   python idempotency.py
+import json
+import time
+import hashlib
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import db
+from models import IdempotencyKey
+from audit import AuditLog, deferred
+from settings import get_settings
+
+MAX_KEY_LENGTH = 255
+# после этого запись "в процессе" считается брошенной (процесс упал до ответа)
+IN_FLIGHT_TIMEOUT = 60
+
+
+def request_fingerprint(scope: str, payload: BaseModel) -> str:
+    body = json.dumps(payload.model_dump(mode="json"), sort_keys=True)
+    return hashlib.blake2b(f"{scope}\n{body}".encode(), digest_size=16).hexdigest()
+
+def replay(fingerprint: str, stored_fingerprint: str, response):
+    if stored_fingerprint != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    if response is None:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress",
+                            headers={"Retry-After": "1"})
+    return response
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float = 86400, max_keys: int = 10000, persist: bool = False):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.persist = persist
+        self.entries = OrderedDict()
+
+    def lookup(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        # запись "в процессе" старше IN_FLIGHT_TIMEOUT - запрос, который так и не завершился
+        if age > self.ttl or (entry[2] is None and age > IN_FLIGHT_TIMEOUT):
+            del self.entries[key]
+            return None
+        return entry
+
+    def remember(self, key: tuple, fingerprint: str, response):
+        self.entries[key] = (time.monotonic(), fingerprint, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def begin(self, actor: str, key: str, fingerprint: str, bind):
+        # None - запрос выполняется впервые, иначе - сохраненный ответ
+        entry = self.lookup((actor, key))
+        if entry is not None:
+            return replay(fingerprint, entry[1], entry[2])
+        if self.persist:
+            response = self.claim(actor, key, fingerprint, bind)
+            if response is not None:
+                self.remember((actor, key), fingerprint, response)
+                return response
+        self.remember((actor, key), fingerprint, None)
+        return None
+
+    def claim(self, actor: str, key: str, fingerprint: str, bind):
+        # ключ занимается в отдельной сессии и сразу коммитится, транзакция запроса не затрагивается
+        now = datetime.now()
+        with Session(bind=bind) as session:
+            row = session.get(IdempotencyKey, (actor, key))
+            if row is not None:
+                expired = row.created_at < now - timedelta(seconds=self.ttl)
+                abandoned = row.response is None and row.created_at < now - timedelta(seconds=IN_FLIGHT_TIMEOUT)
+                if not (expired or abandoned):
+                    return replay(fingerprint, row.fingerprint, None if row.response is None else json.loads(row.response))
+                row.fingerprint, row.response, row.created_at = fingerprint, None, now
+            else:
+                session.add(IdempotencyKey(librarian=actor, key=key, fingerprint=fingerprint, response=None, created_at=now))
+            try:
+                session.commit()
+            except IntegrityError:
+                # тот же ключ только что занял другой процесс
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress",
+                                    headers={"Retry-After": "1"})
+        return None
+
+    def store(self, actor: str, key: str, response, db: Session):
+        # выполняется в транзакции операции: ответ сохраняется тогда и только тогда, когда закоммичена операция
+        db.execute(update(IdempotencyKey).where(
+            IdempotencyKey.librarian == actor, IdempotencyKey.key == key
+        ).values(response=json.dumps(response)))
+
+    def abort(self, actor: str, key: str, bind):
+        # ошибки не сохраняются: после исправления запроса клиент может повторить его с тем же ключом
+        self.entries.pop((actor, key), None)
+        if self.persist:
+            with Session(bind=bind) as session:
+                session.execute(delete(IdempotencyKey).where(
+                    IdempotencyKey.librarian == actor, IdempotencyKey.key == key, IdempotencyKey.response.is_(None)
+                ))
+                session.commit()
+
+    def purge(self, db: Session) -> int:
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        deleted = db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)).rowcount
+        db.commit()
+        return deleted
+
+
+def app_idempotency_store(request: Request) -> IdempotencyStore:
+    return request.app.state.idempotency_store
+
+
+async def idempotent(key: str | None, actor: str, scope: str, payload: BaseModel, db: Session,
+                     idempotency_store: IdempotencyStore, audit_log: AuditLog, call):
+    # call(session) выполняет операцию в переданной сессии
+    if key is None:
+        return await call(db)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+    fingerprint = request_fingerprint(scope, payload)
+    bind = db.get_bind()
+    response = idempotency_store.begin(actor, key, fingerprint, bind)
+    if response is not None:
+        return response
+    done = False
+    try:
+        if idempotency_store.persist:
+            # операция работает в сессии поверх транзакции запроса (ее commit() только освобождает savepoint),
+            # ответ пишется в ту же транзакцию, и обе записи коммитятся вместе
+            session = Session(bind=db.connection(), join_transaction_mode="create_savepoint")
+            try:
+                with deferred() as audit_events:
+                    response = jsonable_encoder(await call(session))
+                idempotency_store.store(actor, key, response, session)
+                session.commit()
+            finally:
+                session.close()
+            db.commit()
+            await audit_log.record_many(audit_events)
+        else:
+            response = jsonable_encoder(await call(db))
+        idempotency_store.remember((actor, key), fingerprint, response)
+        done = True
+        return response
+    finally:
+        # в том числе при отмене запроса (CancelledError)
+        if not done:
+            if idempotency_store.persist:
+                db.rollback()
+            idempotency_store.abort(actor, key, bind)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired rows from idempotency_keys")
+    parser.parse_args()
+
+    settings = get_settings()
+    db.init_engine(settings)
+    idempotency_store = IdempotencyStore(settings.idempotency_ttl, settings.idempotency_max_keys, True)
+    with db.SessionLocal() as db_session:
+        deleted = idempotency_store.purge(db_session)
+    db.dispose_engine()
+    print(f"deleted {deleted} expired idempotency keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import Depends, HTTPException, APIRouter, Request
+
+from auth import verify_token
+
+router = APIRouter()
+
+POINT_COST = 1
+LISTING_COST = 20
+MAX_TRACKED_LIBRARIANS = 10000
+
+
+def listing_cost(*id_params: str):
+    # один эндпоинт отдает и одну запись, и весь список - полный список дороже
+    def cost(query) -> int:
+        return POINT_COST if any(query.get(name) for name in id_params) else LISTING_COST
+    return cost
+
+
+class RateLimiter:
+    # token bucket на каждого библиотекаря (sub из access токена);
+    # при полном ведре пропускается и запрос дороже burst, ведро уходит в минус
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = OrderedDict()
+        self.rejected = {}
+
+    def acquire(self, key: str, cost: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= min(cost, self.burst):
+            self.store(key, tokens - cost, now)
+            return 0
+        self.store(key, tokens, now)
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+        return (min(cost, self.burst) - tokens) / self.rate
+
+    def store(self, key: str, tokens: float, now: float):
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > MAX_TRACKED_LIBRARIANS:
+            self.buckets.popitem(last=False)
+
+    def clear(self):
+        self.buckets.clear()
+        self.rejected.clear()
+
+
+class AdmissionController:
+    # ограничение одновременных запросов к бд: лишние получают 503 раньше, чем закончится пул
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.rejected = 0
+
+    def enter(self) -> bool:
+        if self.in_flight >= self.max_concurrency:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def leave(self):
+        self.in_flight -= 1
+
+
+def check_rate(request: Request, current_user: str, cost: float):
+    retry_after = request.app.state.rate_limiter.acquire(current_user, cost)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Too many requests",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+
+def rate_limited(cost):
+    async def dependency(request: Request, current_user: str = Depends(verify_token)):
+        check_rate(request, current_user, cost(request.query_params) if callable(cost) else cost)
+        return current_user
+    dependency.cost = cost
+    return dependency
+
+async def admission(request: Request):
+    controller = request.app.state.admission
+    if not controller.enter():
+        raise HTTPException(status_code=503, detail="Server is overloaded", headers={"Retry-After": "1"})
+    try:
+        yield
+    finally:
+        controller.leave()
+
+
+@router.get("/limits/stats", response_model=dict)
+async def limits_stats_endpoint(request: Request, current_user: str = Depends(verify_token)):
+    limiter = request.app.state.rate_limiter
+    controller = request.app.state.admission
+    return {
+        "in_flight": controller.in_flight,
+        "max_concurrency": controller.max_concurrency,
+        "rejected_overloaded": controller.rejected,
+        "rejected_rate_limited": sum(limiter.rejected.values()),
+        "rejected_by_librarian": dict(limiter.rejected),
+    }
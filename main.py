@@ -1,12 +1,73 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+
+import db
+from settings import Settings, get_settings
+from cache import ListingCache
+from audit import router as audit_router, AuditLog
+from overdue import OverdueScheduler
+from idempotency import IdempotencyStore
+from limits import router as limits_router, RateLimiter, AdmissionController
+from compression import CompressionMiddleware
 from auth import router as auth_router
 from book_manage import router as book_manage_router
 from users_manage import router as user_manage_router
 from operations import router as operations_router
+from branches import router as branches_router
+from holds import router as holds_router
+from batch import router as batch_router, warm_validators
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = app.state.settings
+    app.state.engine = engine = db.create_db_engine(settings)
+    app.state.sessionmaker = db.make_sessionmaker(engine)
+    # пул открывается до первого запроса, схемы и валидаторы собираются заранее
+    await run_in_threadpool(db.warm_pool, engine, settings.pool_warmup)
+    warm_validators()
+    app.openapi()
+    app.state.audit_log.start(app.state.sessionmaker)
+    app.state.overdue_scheduler.start(app.state.sessionmaker)
+    yield
+    await app.state.overdue_scheduler.stop()
+    # накопленные события аудита записываются до закрытия пула
+    await app.state.audit_log.stop()
+    app.state.listing_cache.clear()
+    app.state.idempotency_store.clear()
+    engine.dispose()
+
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings = settings or get_settings()
+    app.state.rate_limiter = RateLimiter(settings.rate_limit_per_second, settings.rate_limit_burst)
+    app.state.admission = AdmissionController(settings.max_concurrent_requests)
+    # кэш, журнал аудита, планировщик и ключи идемпотентности у каждого приложения свои
+    app.state.listing_cache = ListingCache(settings.listing_cache_ttl, settings.listing_cache_stale_ttl,
+                                           settings.listing_query_deadline)
+    app.state.audit_log = AuditLog(settings.audit_queue_size, settings.audit_batch_size,
+                                   settings.audit_flush_interval, settings.audit_enqueue_timeout)
+    app.state.overdue_scheduler = OverdueScheduler(settings.overdue_scan_interval, settings.overdue_batch_size)
+    app.state.idempotency_store = IdempotencyStore(settings.idempotency_ttl, settings.idempotency_max_keys,
+                                                   settings.idempotency_persist)
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_minimum_size,
+                       cache_size=settings.compression_cache_size)
+    app.include_router(auth_router)
+    app.include_router(book_manage_router)
+    app.include_router(user_manage_router)
+    app.include_router(operations_router)
+    app.include_router(branches_router)
+    app.include_router(holds_router)
+    app.include_router(batch_router)
+    app.include_router(audit_router)
+    app.include_router(limits_router)
+    return app
 
 
-app = FastAPI()
-app.include_router(auth_router)
-app.include_router(book_manage_router)
-app.include_router(user_manage_router)
-app.include_router(operations_router)
\ No newline at end of file
+# запуск: uvicorn main:create_app --factory
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(create_app())
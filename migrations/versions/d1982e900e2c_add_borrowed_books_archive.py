@@ -0,0 +1,52 @@
+"""add borrowed_books archive
+
+Revision ID: d1982e900e2c
+Revises: 198586b8910c
+Create Date: 2026-10-19 14:02:11.418203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1982e900e2c'
+down_revision: Union[str, None] = '198586b8910c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('borrowed_books_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('borrow_date', sa.DateTime(), nullable=False),
+    sa.Column('return_date', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_borrowed_books_archive_user_id'), 'borrowed_books_archive', ['user_id'], unique=False)
+    op.create_index(op.f('ix_borrowed_books_archive_book_id'), 'borrowed_books_archive', ['book_id'], unique=False)
+    op.create_index(op.f('ix_borrowed_books_archive_borrow_date'), 'borrowed_books_archive', ['borrow_date'], unique=False)
+    op.create_index('ix_borrowed_books_active', 'borrowed_books', ['user_id', 'book_id'], unique=False,
+                    postgresql_where=sa.text('return_date IS NULL'))
+    op.create_index('ix_borrowed_books_return_date', 'borrowed_books', ['return_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # выдачи из архива возвращаются в основную таблицу
+    op.execute(
+        "INSERT INTO borrowed_books (id, user_id, book_id, borrow_date, return_date) "
+        "SELECT id, user_id, book_id, borrow_date, return_date FROM borrowed_books_archive"
+    )
+    op.drop_index('ix_borrowed_books_return_date', table_name='borrowed_books')
+    op.drop_index('ix_borrowed_books_active', table_name='borrowed_books',
+                  postgresql_where=sa.text('return_date IS NULL'))
+    op.drop_index(op.f('ix_borrowed_books_archive_borrow_date'), table_name='borrowed_books_archive')
+    op.drop_index(op.f('ix_borrowed_books_archive_book_id'), table_name='borrowed_books_archive')
+    op.drop_index(op.f('ix_borrowed_books_archive_user_id'), table_name='borrowed_books_archive')
+    op.drop_table('borrowed_books_archive')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, Float, Text
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -18,12 +18,40 @@ class Book(Base):
     isbn = Column(String(13), unique=True)
     amount = Column(Integer, nullable=False)
     description = Column(String, nullable=True)
+    # удаленные книги и пользователи скрыты из чтения, строки удаляет purge.py
+    deleted_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # чтение идет только по живым строкам (deleted_at IS NULL), purge - только по удаленным
+        Index("ix_library_live", "id", postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)),
+        Index("ix_library_deleted_at", "deleted_at",
+              postgresql_where=deleted_at.isnot(None), sqlite_where=deleted_at.isnot(None)),
+    )
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
     email = Column(String(255), unique=True, nullable=False)
+    deleted_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_users_live", "id", postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)),
+        Index("ix_users_deleted_at", "deleted_at",
+              postgresql_where=deleted_at.isnot(None), sqlite_where=deleted_at.isnot(None)),
+    )
+
+class Branch(Base):
+    __tablename__ = "branches"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)
+
+# экземпляры книги в конкретном филиале; Book.amount - экземпляры, не закрепленные за филиалом
+class BranchStock(Base):
+    __tablename__ = "branch_stock"
+    book_id = Column(Integer, ForeignKey("library.id"), primary_key=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    amount = Column(Integer, nullable=False, default=0)
 
 class BorrowedBooks(Base):
     __tablename__ = "borrowed_books"
@@ -31,4 +59,90 @@ class BorrowedBooks(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     book_id = Column(Integer, ForeignKey("library.id"), nullable=False)
     borrow_date = Column(DateTime, nullable=False)
-    return_date = Column(DateTime, nullable=True)
\ No newline at end of file
+    return_date = Column(DateTime, nullable=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=True)
+    due_date = Column(DateTime, nullable=True)
+    overdue_notified_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # активные выдачи (return_date IS NULL) - горячая часть таблицы
+        Index(
+            "ix_borrowed_books_active", "user_id", "book_id",
+            postgresql_where=return_date.is_(None),
+            sqlite_where=return_date.is_(None)
+        ),
+        Index("ix_borrowed_books_return_date", "return_date"),
+        # только открытые выдачи, по которым еще нет уведомления: задача из overdue.py
+        # читает отсюда просроченные по порядку due_date и не сканирует всю таблицу
+        Index(
+            "ix_borrowed_books_overdue", "due_date",
+            postgresql_where=return_date.is_(None) & overdue_notified_at.is_(None),
+            sqlite_where=return_date.is_(None) & overdue_notified_at.is_(None)
+        ),
+    )
+
+# закрытые выдачи переносятся сюда задачей из archive.py
+class ArchivedBorrowedBooks(Base):
+    __tablename__ = "borrowed_books_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    book_id = Column(Integer, nullable=False, index=True)
+    borrow_date = Column(DateTime, nullable=False, index=True)
+    return_date = Column(DateTime, nullable=False)
+    branch_id = Column(Integer, nullable=True)
+    due_date = Column(DateTime, nullable=True)
+
+# top-K книг, которые чаще всего брали те же пользователи (строится recommendations.py)
+class RelatedBook(Base):
+    __tablename__ = "related_books"
+    book_id = Column(Integer, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    related_book_id = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+
+# очередь на книгу: возвращенный экземпляр сразу выдается первому подходящему из очереди
+class Hold(Base):
+    __tablename__ = "holds"
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey("library.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    fulfilled_at = Column(DateTime, nullable=True)
+    loan_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_holds_book_created", "book_id", "created_at"),
+    )
+
+# уведомления о просрочке; loan_id без внешнего ключа - выдача может уйти в архив
+class OverdueNotice(Base):
+    __tablename__ = "overdue_notices"
+    id = Column(Integer, primary_key=True)
+    loan_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    book_id = Column(Integer, nullable=False)
+    due_date = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+# первый ответ на запрос с Idempotency-Key (response = NULL, пока запрос выполняется)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    librarian = Column(String(255), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(32), nullable=False)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+# действия библиотекарей; пишется пачками фоновой задачей из audit.py
+class AuditEntry(Base):
+    __tablename__ = "audit_log"
+    id = Column(Integer, primary_key=True)
+    actor = Column(String(255), nullable=False, index=True)
+    action = Column(String(20), nullable=False)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_audit_log_entity", "entity", "entity_id"),
+    )
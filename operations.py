@@ -1,53 +1,79 @@
 import os
 import json
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import partial
 
-from fastapi import Depends, HTTPException, APIRouter, Query
+from fastapi import Depends, HTTPException, APIRouter, Query, Header
 from pydantic import BaseModel, Field, EmailStr
 from sqlalchemy.orm import Session
 
-from models import Book, User, BorrowedBooks
-from db import get_db
-from auth import verify_token
+from models import Book, BorrowedBooks, ArchivedBorrowedBooks
+from db import get_db_with_deadline
+from limits import rate_limited, admission, POINT_COST, LISTING_COST
+from cache import ListingCache, app_listing_cache
+from branches import take_branch_copy, put_branch_copy
+from settings import Settings, app_settings
+from audit import AuditLog, app_audit_log
+from idempotency import IdempotencyStore, app_idempotency_store, idempotent
+from queries import book_by_id, user_by_id, active_loan, active_loan_count, pending_holds, pending_hold
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(admission)])
+
+MAX_ACTIVE_LOANS = 3
+HOLD_SCAN_SIZE = 20
 
 class BorrowBookInput(BaseModel):
     book_id: int = Field(ge=0)
     user_id: int = Field(ge=0)
+    branch_id: int | None = Field(default=None, ge=0)
 
 
-async def borrow_book(book_id: int, user_id: int, db: Session):
+async def borrow_book(book_id: int, user_id: int, db: Session, listing_cache: ListingCache, branch_id: int | None = None, loan_period_days: int = 14):
     try:
-        book = db.query(Book).filter(Book.id==book_id).first()
+        book = book_by_id(db, book_id)
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
-        user = db.query(User).filter(User.id==user_id).first()
+        user = user_by_id(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        active_books = db.query(BorrowedBooks).filter(BorrowedBooks.user_id==user_id, BorrowedBooks.return_date==None).count()
-        if active_books >= 3:
+        active_books = active_loan_count(db, user_id)
+        if active_books >= MAX_ACTIVE_LOANS:
             raise HTTPException(status_code=400, detail="User has already borrowed 3 books")
-        if book.amount <= 0:
-            raise HTTPException(status_code=400, detail="Book is not available")
-        book.amount -= 1
+        if branch_id is not None:
+            take_branch_copy(book_id, branch_id, db)
+        else:
+            if book.amount <= 0:
+                raise HTTPException(status_code=400, detail="Book is not available")
+            book.amount -= 1
 
+        borrow_date = datetime.now()
         borrowed_book = BorrowedBooks(
             user_id=user_id,
             book_id=book_id,
-            borrow_date=datetime.now(),
-            return_date=None
+            borrow_date=borrow_date,
+            return_date=None,
+            branch_id=branch_id,
+            due_date=borrow_date + timedelta(days=loan_period_days)
         )
 
         db.add(borrowed_book)
+        db.flush()
+        # заявка того же читателя на эту книгу закрывается этой выдачей, иначе при возврате книга вернется к нему же
+        hold = pending_hold(db, user_id, book_id)
+        if hold:
+            hold.fulfilled_at = borrow_date
+            hold.loan_id = borrowed_book.id
         db.commit()
+        listing_cache.invalidate("books", "borrowed_books", "borrowed_books_history")
 
         return {
-            "status": "success", 
+            "status": "success", "loan id": borrowed_book.id,
             "book": book.title, "book id": book_id,
-            "user": user.name, "user id": user_id
+            "user": user.name, "user id": user_id,
+            "branch id": branch_id,
+            "due_date": borrowed_book.due_date
             }
         
     except HTTPException:
@@ -56,30 +82,62 @@ async def borrow_book(book_id: int, user_id: int, db: Session):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
 
-async def return_book(book_id: int, user_id: int, db: Session):
+def hand_to_next_hold(book: Book, branch_id: int | None, db: Session, now: datetime, loan_period_days: int,
+                      returned_by: int | None = None):
+    # первый в очереди, кто сейчас может взять книгу; остальные ждут следующего возврата.
+    # вернувший книгу читатель ее сразу не получает, даже если у него осталась заявка
+    for hold in pending_holds(db, book.id, HOLD_SCAN_SIZE):
+        if hold.user_id == returned_by or active_loan_count(db, hold.user_id) >= MAX_ACTIVE_LOANS or active_loan(db, hold.user_id, book.id):
+            continue
+        loan = BorrowedBooks(
+            user_id=hold.user_id,
+            book_id=book.id,
+            borrow_date=now,
+            return_date=None,
+            branch_id=branch_id,
+            due_date=now + timedelta(days=loan_period_days)
+        )
+        db.add(loan)
+        db.flush()
+        hold.fulfilled_at = now
+        hold.loan_id = loan.id
+        return hold
+    return None
+
+async def return_book(book_id: int, user_id: int, db: Session, listing_cache: ListingCache, branch_id: int | None = None, loan_period_days: int = 14):
     try:
-        book = db.query(Book).filter(Book.id==book_id).first()
+        book = book_by_id(db, book_id)
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
-        user = db.query(User).filter(User.id==user_id).first()
+        user = user_by_id(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        borrowed = db.query(BorrowedBooks).filter(
-            BorrowedBooks.user_id==user.id, 
-            BorrowedBooks.book_id==book.id, 
-            BorrowedBooks.return_date==None).first()
+        borrowed = active_loan(db, user.id, book.id)
         
         if not borrowed:
             raise HTTPException(status_code=400, detail="Such book wasn't borrowed by this user or it was already returned")
-        book.amount += 1
-
+        # экземпляр возвращается в филиал, где его сдали, иначе туда, где его взяли
+        if branch_id is None:
+            branch_id = borrowed.branch_id
         borrowed.return_date = datetime.now()
+        db.flush()
+
+        # экземпляр уходит следующему в очереди в той же транзакции, иначе - обратно в фонд
+        hold = hand_to_next_hold(book, branch_id, db, borrowed.return_date, loan_period_days, user.id)
+        if hold is None:
+            if branch_id is not None:
+                put_branch_copy(book.id, branch_id, db)
+            else:
+                book.amount += 1
         db.commit()
-        return {"status": "success",
+        listing_cache.invalidate("books", "borrowed_books", "borrowed_books_history")
+        return {"status": "success", "loan id": borrowed.id,
                 "book": book.title, "book id": book_id,
                 "user": user.name, "user id": user_id,
-                "return_date": borrowed.return_date
+                "branch id": branch_id,
+                "return_date": borrowed.return_date,
+                "hold": {"hold id": hold.id, "user id": hold.user_id, "loan id": hold.loan_id} if hold else None
                 }
     
     except HTTPException:
@@ -87,27 +145,33 @@ async def return_book(book_id: int, user_id: int, db: Session):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
-async def get_all_borrowed_books(db: Session):
-    try:
-        borrowed_books = db.query(BorrowedBooks).all()
-        data = [{
-            "user_id": borrowed.user_id,
-            "book_id": borrowed.book_id,
-            "borrow_date": str(borrowed.borrow_date),
-            "return_date": str(borrowed.return_date) if borrowed.return_date else None
-        } for borrowed in borrowed_books]
-        
-        os.makedirs("tables", exist_ok=True)
-        with open("tables/all_borrowed_books.json", "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
+def load_all_borrowed_books(db: Session, history: bool = False):
+    borrowed_books = db.query(BorrowedBooks).all()
+    if history:
+        borrowed_books += db.query(ArchivedBorrowedBooks).all()
+    data = [{
+        "user_id": borrowed.user_id,
+        "book_id": borrowed.book_id,
+        "borrow_date": str(borrowed.borrow_date),
+        "return_date": str(borrowed.return_date) if borrowed.return_date else None
+    } for borrowed in borrowed_books]
 
-        return data
+    os.makedirs("tables", exist_ok=True)
+    with open("tables/all_borrowed_books.json", "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+    return data
+
+async def get_all_borrowed_books(db: Session, listing_cache: ListingCache, history: bool = False):
+    try:
+        # без history читается только основная таблица, архив закрытых выдач не затрагивается
+        key = "borrowed_books_history" if history else "borrowed_books"
+        return await listing_cache.get(key, partial(load_all_borrowed_books, history=history), db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
     
 async def get_unreturned_books(user_id: str, db: Session):
     try:
-        user = db.query(User).filter(User.id==user_id).first()
+        user = user_by_id(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         borrowed_books = db.query(BorrowedBooks).filter(
@@ -117,6 +181,7 @@ async def get_unreturned_books(user_id: str, db: Session):
             "user_id": borrowed.user_id,
             "book_id": borrowed.book_id,
             "borrow_date": str(borrowed.borrow_date),
+            "due_date": str(borrowed.due_date) if borrowed.due_date else None,
             "return_date": None
         } for borrowed in borrowed_books]
         os.makedirs("tables", exist_ok=True)
@@ -131,14 +196,24 @@ async def get_unreturned_books(user_id: str, db: Session):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.post("/operation/borrow", response_model=dict)
-async def borrow_book_endpoint(input_data: BorrowBookInput, current_user: str=Depends(verify_token),  db: Session = Depends(get_db)):
-    return await borrow_book(input_data.book_id, input_data.user_id, db)
+async def borrow_book_endpoint(input_data: BorrowBookInput, current_user: str=Depends(rate_limited(POINT_COST)),  db: Session = Depends(get_db_with_deadline("query_deadline")), settings: Settings = Depends(app_settings), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log), idempotency_store: IdempotencyStore = Depends(app_idempotency_store), idempotency_key: str | None = Header(default=None)):
+    async def borrow(db: Session):
+        result = await borrow_book(input_data.book_id, input_data.user_id, db, listing_cache, input_data.branch_id, settings.loan_period_days)
+        await audit_log.record(current_user, "lend", "loan", result["loan id"])
+        return result
+    return await idempotent(idempotency_key, current_user, "borrow", input_data, db, idempotency_store, audit_log, borrow)
 @router.post("/operation/return", response_model=dict)
-async def return_book_endpoint(input_data: BorrowBookInput, current_user: str=Depends(verify_token), db: Session = Depends(get_db)):
-    return await return_book(input_data.book_id, input_data.user_id, db)
+async def return_book_endpoint(input_data: BorrowBookInput, current_user: str=Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), settings: Settings = Depends(app_settings), listing_cache: ListingCache = Depends(app_listing_cache), audit_log: AuditLog = Depends(app_audit_log), idempotency_store: IdempotencyStore = Depends(app_idempotency_store), idempotency_key: str | None = Header(default=None)):
+    async def give_back(db: Session):
+        result = await return_book(input_data.book_id, input_data.user_id, db, listing_cache, input_data.branch_id, settings.loan_period_days)
+        await audit_log.record(current_user, "receive", "loan", result["loan id"])
+        if result["hold"]:
+            await audit_log.record(current_user, "lend", "loan", result["hold"]["loan id"])
+        return result
+    return await idempotent(idempotency_key, current_user, "return", input_data, db, idempotency_store, audit_log, give_back)
 @router.get("/operation/get_all_borrowed_books", response_model=list[dict])
-async def get_all_borrowed_books_endpoint(current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
-    return await get_all_borrowed_books(db)
+async def get_all_borrowed_books_endpoint(history: bool = Query(default=False), current_user: str = Depends(rate_limited(LISTING_COST)), db: Session = Depends(get_db_with_deadline("listing_query_deadline")), listing_cache: ListingCache = Depends(app_listing_cache)):
+    return await get_all_borrowed_books(db, listing_cache, history)
 @router.get("/operation/get_unreturned_books/{user_id}", response_model=dict)
-async def get_unreturned_books_endpoint(user_id: int, current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
+async def get_unreturned_books_endpoint(user_id: int, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline"))):
     return await get_unreturned_books(user_id, db)
\ No newline at end of file
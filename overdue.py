@@ -0,0 +1,107 @@
+# отметка просроченных выдач и запись уведомлений пачками:
+#   python overdue.py --batch-size 500
+# в приложении та же задача выполняется раз в OVERDUE_SCAN_INTERVAL секунд (см. lifespan в main.py)
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import db
+from models import BorrowedBooks, OverdueNotice
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_BATCH_SIZE = 500
+
+
+def process_overdue_loans(db_session: Session, batch_size: int = OVERDUE_BATCH_SIZE, now: datetime | None = None) -> int:
+    now = now or datetime.now()
+    processed = 0
+    while True:
+        # ix_borrowed_books_overdue содержит только открытые выдачи без уведомления,
+        # поэтому каждая пачка - короткий проход по индексу, а обработанные из него выпадают
+        loans = db_session.execute(
+            select(BorrowedBooks.id, BorrowedBooks.user_id, BorrowedBooks.book_id, BorrowedBooks.due_date)
+            .where(
+                BorrowedBooks.return_date.is_(None),
+                BorrowedBooks.overdue_notified_at.is_(None),
+                BorrowedBooks.due_date < now
+            )
+            .order_by(BorrowedBooks.due_date)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not loans:
+            break
+        db_session.execute(
+            update(BorrowedBooks)
+            .where(BorrowedBooks.id.in_([loan.id for loan in loans]))
+            .values(overdue_notified_at=now)
+        )
+        db_session.execute(insert(OverdueNotice), [{
+            "loan_id": loan.id,
+            "user_id": loan.user_id,
+            "book_id": loan.book_id,
+            "due_date": loan.due_date,
+            "created_at": now
+        } for loan in loans])
+        db_session.commit()
+        processed += len(loans)
+    return processed
+
+def run_once(session_factory, batch_size: int) -> int:
+    with session_factory() as db_session:
+        return process_overdue_loans(db_session, batch_size)
+
+
+class OverdueScheduler:
+    def __init__(self, interval: float = 300, batch_size: int = OVERDUE_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.task = None
+        self.session_factory = None
+        self.processed = 0
+
+    def start(self, session_factory):
+        self.session_factory = session_factory
+        # 0 - задача отключена (например, ее запускает cron через cli)
+        if self.interval > 0:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.processed += await run_in_threadpool(run_once, self.session_factory, self.batch_size)
+            except Exception as e:
+                logger.warning("overdue processing failed: %s", e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark overdue loans and record overdue notices")
+    parser.add_argument("--batch-size", type=int, default=OVERDUE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db.init_engine(get_settings())
+    processed = run_once(db.SessionLocal, args.batch_size)
+    db.dispose_engine()
+    print(f"marked {processed} overdue loans")
+
+
+if __name__ == "__main__":
+    main()
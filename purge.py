@@ -0,0 +1,108 @@
+# удаление книг и пользователей: эндпоинты только помечают строки (deleted_at),
+# окончательно их удаляет эта задача пачками:
+#   python purge.py --older-than-days 30 --batch-size 500
+# закрытые выдачи удаляемых строк переносятся в borrowed_books_archive, история выдач сохраняется
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, exists, or_
+from sqlalchemy.orm import Session
+
+import db
+from models import Book, User, BorrowedBooks, Hold, BranchStock, RelatedBook
+from archive import move_to_archive
+from settings import get_settings
+
+BULK_DELETE_CHUNK = 1000
+PURGE_BATCH_SIZE = 500
+PURGE_AFTER_DAYS = 30
+
+
+def soft_delete_rows(db_session: Session, model, loan_column, hold_column, ids: list[int], now: datetime | None = None):
+    # условный UPDATE: строка с активной выдачей не помечается, даже если выдачу оформили после выбора ids.
+    # skipped - строки с активными выдачами, missing - несуществующие и уже удаленные
+    now = now or datetime.now()
+    deleted, skipped, missing = [], [], []
+    for start in range(0, len(ids), BULK_DELETE_CHUNK):
+        chunk = list(dict.fromkeys(ids[start:start + BULK_DELETE_CHUNK]))
+        marked = set(db_session.scalars(
+            update(model)
+            .where(
+                model.id.in_(chunk),
+                model.deleted_at.is_(None),
+                ~exists().where(loan_column == model.id, BorrowedBooks.return_date.is_(None))
+            )
+            .values(deleted_at=now)
+            .returning(model.id)
+        ))
+        if marked:
+            db_session.execute(delete(Hold).where(hold_column.in_(list(marked)), Hold.fulfilled_at.is_(None)))
+        rest = [i for i in chunk if i not in marked]
+        busy = set(db_session.scalars(
+            select(model.id).where(model.id.in_(rest), model.deleted_at.is_(None))
+        )) if rest else set()
+        deleted += [i for i in chunk if i in marked]
+        skipped += [i for i in rest if i in busy]
+        missing += [i for i in rest if i not in busy]
+    return deleted, skipped, missing
+
+def purge_rows(db_session: Session, model, loan_column, hold_column, cleanup, older_than: timedelta,
+               batch_size: int, now: datetime | None = None) -> int:
+    cutoff = (now or datetime.now()) - older_than
+    purged = 0
+    while True:
+        ids = db_session.scalars(
+            select(model.id)
+            .where(
+                model.deleted_at < cutoff,
+                ~exists().where(loan_column == model.id, BorrowedBooks.return_date.is_(None))
+            )
+            .order_by(model.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        loan_ids = db_session.scalars(select(BorrowedBooks.id).where(loan_column.in_(ids))).all()
+        if loan_ids:
+            move_to_archive(db_session, loan_ids)
+        db_session.execute(delete(Hold).where(hold_column.in_(ids)))
+        for statement in cleanup(ids):
+            db_session.execute(statement)
+        db_session.execute(delete(model).where(model.id.in_(ids)))
+        # каждая пачка - отдельная короткая транзакция
+        db_session.commit()
+        purged += len(ids)
+    return purged
+
+def book_cleanup(ids: list[int]):
+    return [
+        delete(BranchStock).where(BranchStock.book_id.in_(ids)),
+        delete(RelatedBook).where(or_(RelatedBook.book_id.in_(ids), RelatedBook.related_book_id.in_(ids))),
+    ]
+
+def purge_books(db_session: Session, older_than: timedelta = timedelta(days=PURGE_AFTER_DAYS),
+                batch_size: int = PURGE_BATCH_SIZE, now: datetime | None = None) -> int:
+    return purge_rows(db_session, Book, BorrowedBooks.book_id, Hold.book_id, book_cleanup, older_than, batch_size, now)
+
+def purge_users(db_session: Session, older_than: timedelta = timedelta(days=PURGE_AFTER_DAYS),
+                batch_size: int = PURGE_BATCH_SIZE, now: datetime | None = None) -> int:
+    return purge_rows(db_session, User, BorrowedBooks.user_id, Hold.user_id, lambda ids: [], older_than, batch_size, now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hard-delete books and users that were deleted more than N days ago")
+    parser.add_argument("--older-than-days", type=int, default=PURGE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db.init_engine(get_settings())
+    with db.SessionLocal() as db_session:
+        older_than = timedelta(days=args.older_than_days)
+        books = purge_books(db_session, older_than, args.batch_size)
+        users = purge_users(db_session, older_than, args.batch_size)
+    db.dispose_engine()
+    print(f"purged {books} books and {users} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# частые запросы взятия/возврата, CRUD книг и логина.
+# lambda_stmt строит запрос один раз на место вызова: при повторных вызовах
+# не создается новый select и не вычисляется ключ кэша компиляции, меняются только параметры
+from sqlalchemy import lambda_stmt, select, func
+from sqlalchemy.orm import Session
+
+from models import Book, User, BorrowedBooks, Librarian, Hold
+
+
+def book_by_id(db: Session, book_id: int) -> Book | None:
+    return db.execute(
+        lambda_stmt(lambda: select(Book).where(Book.id == book_id, Book.deleted_at.is_(None)))
+    ).scalar_one_or_none()
+
+def user_by_id(db: Session, user_id: int) -> User | None:
+    return db.execute(
+        lambda_stmt(lambda: select(User).where(User.id == user_id, User.deleted_at.is_(None)))
+    ).scalar_one_or_none()
+
+def librarian_by_email(db: Session, email: str) -> Librarian | None:
+    return db.execute(
+        lambda_stmt(lambda: select(Librarian).where(Librarian.email == email).limit(1))
+    ).scalar_one_or_none()
+
+def book_exists(db: Session, title: str, author: str, date: str | None) -> bool:
+    stmt = lambda_stmt(lambda: select(Book.id).where(Book.author == author, Book.deleted_at.is_(None)))
+    # date может быть None: для него нужен IS NULL, поэтому это отдельный вариант запроса
+    if date is None:
+        stmt += lambda s: s.where(Book.title == title, Book.date.is_(None))
+    else:
+        stmt += lambda s: s.where(Book.title == title, Book.date == date)
+    stmt += lambda s: s.limit(1)
+    return db.execute(stmt).first() is not None
+
+def active_loan_count(db: Session, user_id: int) -> int:
+    return db.execute(lambda_stmt(
+        lambda: select(func.count()).select_from(BorrowedBooks)
+        .where(BorrowedBooks.user_id == user_id, BorrowedBooks.return_date.is_(None))
+    )).scalar_one()
+
+def active_loan(db: Session, user_id: int, book_id: int) -> BorrowedBooks | None:
+    return db.execute(lambda_stmt(
+        lambda: select(BorrowedBooks)
+        .where(BorrowedBooks.user_id == user_id, BorrowedBooks.book_id == book_id,
+               BorrowedBooks.return_date.is_(None))
+        .limit(1)
+    )).scalar_one_or_none()
+
+def pending_holds(db: Session, book_id: int, limit: int) -> list[Hold]:
+    return db.execute(lambda_stmt(
+        lambda: select(Hold)
+        .where(Hold.book_id == book_id, Hold.fulfilled_at.is_(None))
+        .order_by(Hold.created_at, Hold.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+
+def pending_hold(db: Session, user_id: int, book_id: int) -> Hold | None:
+    return db.execute(lambda_stmt(
+        lambda: select(Hold)
+        .where(Hold.book_id == book_id, Hold.user_id == user_id, Hold.fulfilled_at.is_(None))
+        .limit(1)
+    )).scalar_one_or_none()
+
+def hold_position(db: Session, hold: Hold) -> int:
+    # сколько незакрытых заявок на ту же книгу стоит раньше (по индексу book_id, created_at)
+    book_id, created_at, hold_id = hold.book_id, hold.created_at, hold.id
+    ahead = db.execute(lambda_stmt(
+        lambda: select(func.count()).select_from(Hold)
+        .where(
+            Hold.book_id == book_id,
+            Hold.fulfilled_at.is_(None),
+            (Hold.created_at < created_at) | ((Hold.created_at == created_at) & (Hold.id < hold_id))
+        )
+    )).scalar_one()
+    return ahead + 1
@@ -0,0 +1,125 @@
+# "с этой книгой также брали": похожесть книг по общим читателям, top-K соседей в related_books
+#   python recommendations.py                   - полная пересборка
+#   python recommendations.py --since-hours 24  - только книги читателей, бравших что-то за последние сутки
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select, insert, delete, union
+from sqlalchemy.orm import Session
+
+import db
+from models import BorrowedBooks, ArchivedBorrowedBooks, RelatedBook
+from settings import get_settings
+
+TOP_K = 20
+BOOK_CHUNK_SIZE = 512
+LOAD_CHUNK_SIZE = 10000
+
+
+def load_pairs(db_session: Session, chunk_size: int = LOAD_CHUNK_SIZE):
+    user_chunks, book_chunks = [], []
+    for table in (BorrowedBooks, ArchivedBorrowedBooks):
+        result = db_session.execute(
+            select(table.user_id, table.book_id).execution_options(yield_per=chunk_size)
+        )
+        for partition in result.partitions():
+            pairs = np.array(partition, dtype=np.int64).reshape(-1, 2)
+            user_chunks.append(pairs[:, 0])
+            book_chunks.append(pairs[:, 1])
+    if not user_chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(user_chunks), np.concatenate(book_chunks)
+
+def build_incidence(user_ids: np.ndarray, book_ids: np.ndarray):
+    # матрица читатель x книга: 1, если читатель хоть раз брал книгу
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    books, book_index = np.unique(book_ids, return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(user_index), dtype=np.float32), (user_index, book_index)),
+        shape=(len(users), len(books))
+    )
+    incidence.sum_duplicates()
+    incidence.data[:] = 1
+    return incidence, books
+
+def top_related(incidence: sparse.csr_matrix, columns: np.ndarray, top_k: int):
+    # co-occurrence для части книг: (len(columns) x все книги), похожесть - косинусная
+    readers = np.asarray(incidence.sum(axis=0)).ravel()
+    cooccurrence = (incidence[:, columns].T @ incidence).tocoo()
+    rows, cols, counts = cooccurrence.row, cooccurrence.col, cooccurrence.data
+    not_self = columns[rows] != cols
+    rows, cols, counts = rows[not_self], cols[not_self], counts[not_self]
+    scores = counts / np.sqrt(readers[columns[rows]] * readers[cols])
+
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = rank < top_k
+    return columns[rows[keep]], rank[keep], cols[keep], scores[keep]
+
+def books_affected_since(db_session: Session, since: datetime) -> list[int]:
+    # новая выдача меняет соседей всех книг, которые когда-либо брал этот читатель
+    recent_users = select(BorrowedBooks.user_id).where(BorrowedBooks.borrow_date >= since)
+    return db_session.scalars(union(
+        select(BorrowedBooks.book_id).where(BorrowedBooks.user_id.in_(recent_users)),
+        select(ArchivedBorrowedBooks.book_id).where(ArchivedBorrowedBooks.user_id.in_(recent_users)),
+    )).all()
+
+def clear_stale_related(db_session: Session, books: np.ndarray, book_ids: list[int] | None, chunk_size: int):
+    # книги, у которых в истории не осталось выдач, не попадают в матрицу, и их старые строки удаляются отдельно
+    if book_ids is None:
+        book_ids = db_session.scalars(select(RelatedBook.book_id).distinct()).all()
+    stale = sorted(set(book_ids) - set(books.tolist()))
+    for start in range(0, len(stale), chunk_size):
+        db_session.execute(delete(RelatedBook).where(RelatedBook.book_id.in_(stale[start:start + chunk_size])))
+    db_session.commit()
+
+def build_related_books(db_session: Session, book_ids: list[int] | None = None,
+                        top_k: int = TOP_K, chunk_size: int = BOOK_CHUNK_SIZE) -> int:
+    user_ids, loan_book_ids = load_pairs(db_session)
+    incidence, books = build_incidence(user_ids, loan_book_ids)
+    incidence = incidence.tocsc()
+    clear_stale_related(db_session, books, book_ids, chunk_size)
+
+    if book_ids is None:
+        targets = np.arange(len(books))
+    else:
+        targets = np.flatnonzero(np.isin(books, book_ids))
+
+    written = 0
+    for start in range(0, len(targets), chunk_size):
+        columns = targets[start:start + chunk_size]
+        book_index, rank, related_index, scores = top_related(incidence, columns, top_k)
+        rows = [
+            {"book_id": int(book_id), "rank": int(position), "related_book_id": int(related_id), "score": float(score)}
+            for book_id, position, related_id, score in zip(books[book_index], rank, books[related_index], scores)
+        ]
+        db_session.execute(delete(RelatedBook).where(RelatedBook.book_id.in_(books[columns].tolist())))
+        if rows:
+            db_session.execute(insert(RelatedBook), rows)
+        db_session.commit()
+        written += len(rows)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build related_books from borrowing history")
+    parser.add_argument("--since-hours", type=float, default=None)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--chunk-size", type=int, default=BOOK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db.init_engine(get_settings())
+    with db.SessionLocal() as db_session:
+        book_ids = None
+        if args.since_hours is not None:
+            book_ids = books_affected_since(db_session, datetime.now() - timedelta(hours=args.since_hours))
+        written = build_related_books(db_session, book_ids, args.top_k, args.chunk_size)
+    db.dispose_engine()
+    print(f"stored {written} related book rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from fastapi import Request
+from pydantic import BaseModel, ConfigDict
+
+
+class Settings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    database_url: str
+    jwt_token: str
+    jwt_algorithm: str
+    jwt_access_token_expire: int
+    jwt_refresh_token_expire: int
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_warmup: int = 5
+
+    query_deadline: float = 5
+    listing_query_deadline: float = 30
+    listing_cache_ttl: float = 2
+    listing_cache_stale_ttl: float = 30
+
+    rate_limit_per_second: float = 10
+    rate_limit_burst: float = 100
+    max_concurrent_requests: int = 15
+
+    compression_minimum_size: int = 1024
+    compression_cache_size: int = 64
+
+    audit_queue_size: int = 10000
+    audit_batch_size: int = 500
+    audit_flush_interval: float = 1
+    audit_enqueue_timeout: float = 0.05
+
+    loan_period_days: int = 14
+    overdue_scan_interval: float = 300
+    overdue_batch_size: int = 500
+
+    idempotency_ttl: float = 86400
+    idempotency_max_keys: int = 10000
+    idempotency_persist: bool = False
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_dotenv()
+        database_url = os.getenv("DATABASE_URL")
+        if database_url is None:
+            user = os.getenv("POSTGRES_USER")
+            password = os.getenv("POSTGRES_PASSWORD")
+            database = os.getenv("POSTGRES_DATABASE")
+            host = os.getenv("POSTGRES_HOST")
+            port = os.getenv("POSTGRES_PORT")
+            database_url = f"postgresql://{user}:{password}@{host}:{port}/{database}"
+
+        # необязательные поля читаются из переменных окружения с тем же именем в верхнем регистре
+        values = {
+            name: os.getenv(name.upper())
+            for name in cls.model_fields
+            if name != "database_url"
+        }
+        values = {name: value for name, value in values.items() if value is not None}
+        return cls(database_url=database_url, **values)
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings.from_env()
+
+def app_settings(request: Request) -> Settings:
+    settings = getattr(request.app.state, "settings", None)
+    return settings if settings is not None else get_settings()
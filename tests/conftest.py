@@ -1,15 +1,20 @@
 import os
 import sys
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool   
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+# файловая бд, чтобы у каждой сессии было свое соединение, как с postgres
+TEST_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ["POOL_WARMUP"] = "1"
 os.environ["JWT_TOKEN"] = "testsecret"
 os.environ["JWT_ALGORITHM"] = "HS256"
 os.environ["JWT_ACCESS_TOKEN_EXPIRE"] = "30"
@@ -19,15 +24,29 @@ import models
 from models import Base
 
 from db import get_db
-from main import app
+from main import create_app
+from settings import get_settings
+from auth import create_access_token
+
 
+app = create_app()
 
-TEST_DATABASE_URL = "sqlite:///:memory:"
 engine = create_engine(
     TEST_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
+    connect_args={"check_same_thread": False}
 )
+
+# pysqlite сам управляет транзакциями и ломает SAVEPOINT (нужен для atomic /batch),
+# поэтому BEGIN отправляется явно
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+    dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
 TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine
 )
@@ -42,6 +61,9 @@ def create_test_database():
 def reset_db():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    app.state.listing_cache.clear()
+    app.state.idempotency_store.clear()
+    app.state.rate_limiter.clear()
     yield
 
 @pytest.fixture
@@ -64,3 +86,15 @@ def client(db_session):
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
+
+
+# общие помощники тестов: from conftest import get_auth_header_for_user, make_client
+def get_auth_header_for_user(email: str):
+    token_data = {"sub": email}
+    access_token = create_access_token(token_data)
+    return {"Authorization": f"Bearer {access_token}"}
+
+def make_client(**overrides):
+    # отдельное приложение со своими настройками (без общего override get_db)
+    settings = get_settings().model_copy(update={"pool_warmup": 0, **overrides})
+    return TestClient(create_app(settings))
@@ -0,0 +1,47 @@
+import pytest
+from datetime import datetime, timedelta
+
+from fastapi import status
+
+from models import Book, User, BorrowedBooks, ArchivedBorrowedBooks
+from auth import create_access_token
+from archive import archive_returned_loans
+
+
+@pytest.fixture
+def loans(db_session):
+    user = User(name="Test User", email="testuser@example.com")
+    book = Book(title="Test Book", author="Author Name", date="2000-01-01", isbn="1234567890123", amount=5)
+    db_session.add_all([user, book])
+    db_session.commit()
+    now = datetime.now()
+    loans = [
+        BorrowedBooks(user_id=user.id, book_id=book.id, borrow_date=now - timedelta(days=90), return_date=now - timedelta(days=60)),
+        BorrowedBooks(user_id=user.id, book_id=book.id, borrow_date=now - timedelta(days=80), return_date=now - timedelta(days=50)),
+        BorrowedBooks(user_id=user.id, book_id=book.id, borrow_date=now - timedelta(days=5), return_date=now - timedelta(days=1)),
+        BorrowedBooks(user_id=user.id, book_id=book.id, borrow_date=now - timedelta(days=70), return_date=None),
+    ]
+    db_session.add_all(loans)
+    db_session.commit()
+    return loans
+
+def test_archive_moves_only_old_returned_loans(db_session, loans):
+    old_ids = {loans[0].id, loans[1].id}
+    moved = archive_returned_loans(db_session, timedelta(days=30), batch_size=1)
+    assert moved == 2
+
+    archived_ids = {loan.id for loan in db_session.query(ArchivedBorrowedBooks).all()}
+    assert archived_ids == old_ids
+    assert db_session.query(BorrowedBooks).count() == 2
+
+def test_history_listing_includes_archive(client, db_session, loans):
+    archive_returned_loans(db_session, timedelta(days=30))
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'librarian@example.com'})}"}
+
+    response = client.get("/operation/get_all_borrowed_books", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 2
+
+    response = client.get("/operation/get_all_borrowed_books", params={"history": True}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 4
@@ -0,0 +1,47 @@
+import asyncio
+
+from fastapi import status
+
+from models import AuditEntry
+from audit import AuditLog
+from conftest import get_auth_header_for_user, make_client
+
+
+book = {"title": "Audit Book", "author": "Author", "date": "2000", "isbn": "1112223334445", "amount": 1}
+
+def test_full_queue_drops_after_timeout():
+    log = AuditLog(queue_size=2, enqueue_timeout=0.01)
+
+    async def run():
+        log.queue = asyncio.Queue(maxsize=log.queue_size)
+        for i in range(3):
+            await log.record("desk@example.com", "create", "book", i)
+
+    asyncio.run(run())
+    assert log.queue.qsize() == 2
+    assert log.dropped == 1
+
+def test_actions_flushed_on_shutdown(db_session):
+    # интервал больше времени теста: события пишет остановка приложения
+    with make_client(audit_flush_interval=60) as c:
+        headers = get_auth_header_for_user("desk@example.com")
+        book_id = c.post("/book/create", json=book, headers=headers).json()["book_id"]
+        assert c.put(f"/book/update/{book_id}", json={"amount": 3}, headers=headers).status_code == status.HTTP_200_OK
+        assert db_session.query(AuditEntry).count() == 0
+        db_session.rollback()
+
+    entries = db_session.query(AuditEntry).order_by(AuditEntry.id).all()
+    assert [(e.actor, e.action, e.entity, e.entity_id) for e in entries] == [
+        ("desk@example.com", "create", "book", book_id),
+        ("desk@example.com", "update", "book", book_id),
+    ]
+
+def test_rolled_back_batch_is_not_audited(db_session):
+    with make_client() as c:
+        batch = {"atomic": True, "requests": [
+            {"method": "POST", "path": "/book/create", "body": book},
+            {"method": "DELETE", "path": "/book/delete/999"},
+        ]}
+        response = c.post("/batch", json=batch, headers=get_auth_header_for_user("desk@example.com"))
+        assert response.json()["committed"] is False
+    assert db_session.query(AuditEntry).count() == 0
@@ -0,0 +1,111 @@
+import pytest
+from fastapi import status, Query
+from fastapi.routing import APIRoute
+from pydantic import ValidationError
+
+from models import Book, User, BorrowedBooks
+from batch import bind_arguments
+from conftest import get_auth_header_for_user
+
+
+@pytest.fixture
+def sample_user(db_session):
+    user = User(name="Test User", email="testuser@example.com")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+@pytest.fixture
+def sample_book(db_session):
+    book = Book(
+        title="Test Book",
+        author="Author Name",
+        date="2000-01-01",
+        isbn="1234567890123",
+        amount=1
+    )
+    db_session.add(book)
+    db_session.commit()
+    return book
+
+def test_batch_runs_sub_requests_in_order(client, sample_user, sample_book, db_session):
+    payload = {"requests": [
+        {"method": "GET", "path": f"/book/get?book_id={sample_book.id}"},
+        {"method": "POST", "path": "/operation/borrow", "body": {"book_id": sample_book.id, "user_id": sample_user.id}},
+        {"method": "GET", "path": f"/operation/get_unreturned_books/{sample_user.id}"},
+    ]}
+    headers = get_auth_header_for_user(sample_user.email)
+
+    response = client.post("/batch", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert data["committed"] is True
+    assert [r["status_code"] for r in data["responses"]] == [200, 200, 200]
+    assert data["responses"][0]["body"][0]["amount"] == 1
+    assert len(data["responses"][2]["body"]["unreturned_books"]) == 1
+
+def test_batch_reports_sub_request_errors(client, sample_user):
+    payload = {"requests": [
+        {"method": "GET", "path": "/book/get", "query": {"book_id": 999}},
+        {"method": "GET", "path": "/nowhere"},
+        {"method": "POST", "path": "/operation/borrow", "body": {"book_id": "x"}},
+    ]}
+    headers = get_auth_header_for_user(sample_user.email)
+
+    response = client.post("/batch", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [r["status_code"] for r in response.json()["responses"]][1:] == [404, 422]
+
+def test_batch_atomic_rolls_back(client, sample_user, sample_book, db_session):
+    payload = {"atomic": True, "requests": [
+        {"method": "POST", "path": "/operation/borrow", "body": {"book_id": sample_book.id, "user_id": sample_user.id}},
+        {"method": "POST", "path": "/operation/borrow", "body": {"book_id": sample_book.id, "user_id": sample_user.id}},
+        {"method": "GET", "path": "/book/get"},
+    ]}
+    headers = get_auth_header_for_user(sample_user.email)
+
+    response = client.post("/batch", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert data["committed"] is False
+    assert [r["status_code"] for r in data["responses"]] == [200, 400, 424]
+
+    db_session.expire_all()
+    assert db_session.query(BorrowedBooks).count() == 0
+    assert db_session.get(Book, sample_book.id).amount == 1
+
+def test_batch_requires_auth(client):
+    response = client.post("/batch", json={"requests": [{"method": "GET", "path": "/book/get"}]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_batch_single_id_is_a_one_item_multi_get(client, sample_user, sample_book):
+    payload = {"requests": [
+        {"method": "GET", "path": f"/book/get?ids={sample_book.id}"},
+        {"method": "GET", "path": "/user/get", "query": {"ids": sample_user.id}},
+    ]}
+    response = client.post("/batch", json=payload, headers=get_auth_header_for_user(sample_user.email))
+    books, users = [r["body"] for r in response.json()["responses"]]
+    assert [book["id"] for book in books["books"]] == [sample_book.id]
+    assert [user["id"] for user in users["users"]] == [sample_user.id]
+
+def test_batch_validates_path_params(client, sample_user, sample_book):
+    payload = {"requests": [
+        {"method": "PUT", "path": "/book/update/abc", "body": {"amount": 2}},
+        {"method": "PUT", "path": f"/book/update/{sample_book.id}", "body": {"amount": 2}},
+    ]}
+    response = client.post("/batch", json=payload, headers=get_auth_header_for_user(sample_user.email))
+    invalid, valid = response.json()["responses"]
+    assert invalid["status_code"] == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert valid["status_code"] == status.HTTP_200_OK
+
+def test_bind_arguments_applies_query_constraints():
+    async def endpoint(item_id: int, limit: int = Query(default=5, ge=1, le=10)):
+        return item_id, limit
+
+    route = APIRoute("/item/{item_id}", endpoint)
+    kwargs = bind_arguments(route, {"item_id": "3"}, {}, None, {"current_user": "desk@example.com"})
+    assert kwargs == {"item_id": 3, "limit": 5}
+    with pytest.raises(ValidationError):
+        bind_arguments(route, {"item_id": "3"}, {"limit": "50"}, None, {"current_user": "desk@example.com"})
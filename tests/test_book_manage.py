@@ -0,0 +1,61 @@
+from fastapi import status
+
+from models import Book, User
+from db import MAX_BATCH_IDS
+from conftest import get_auth_header_for_user
+
+
+def make_books(db_session, count: int):
+    books = [Book(
+        title=f"Book {i}",
+        author="Author Name",
+        date="2000-01-01",
+        isbn=f"{i:013d}",
+        amount=1
+    ) for i in range(count)]
+    db_session.add_all(books)
+    db_session.commit()
+    return books
+
+def test_get_books_by_ids_preserves_order(client, db_session):
+    books = make_books(db_session, 3)
+    ids = [books[2].id, books[0].id]
+    headers = get_auth_header_for_user("librarian@example.com")
+
+    response = client.get("/book/get", params={"ids": ids}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert [book["id"] for book in data["books"]] == ids
+    assert data["missing"] == []
+
+def test_get_books_by_ids_reports_missing(client, db_session):
+    books = make_books(db_session, 1)
+    headers = get_auth_header_for_user("librarian@example.com")
+
+    response = client.get("/book/get", params={"ids": [books[0].id, 999]}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert len(data["books"]) == 1
+    assert data["missing"] == [999]
+
+def test_get_books_by_ids_too_many(client):
+    headers = get_auth_header_for_user("librarian@example.com")
+    ids = list(range(1, MAX_BATCH_IDS + 2))
+
+    response = client.get("/book/get", params={"ids": ids}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_get_users_by_ids(client, db_session):
+    users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(2)]
+    db_session.add_all(users)
+    db_session.commit()
+    headers = get_auth_header_for_user("librarian@example.com")
+
+    response = client.get("/user/get", params={"ids": [users[1].id, 42, users[0].id]}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert [user["id"] for user in data["users"]] == [users[1].id, users[0].id]
+    assert data["missing"] == [42]
@@ -0,0 +1,65 @@
+import pytest
+
+from fastapi import status
+
+from models import Book, User, Branch, BranchStock, BorrowedBooks
+from conftest import get_auth_header_for_user
+
+
+@pytest.fixture
+def stocked_book(db_session):
+    book = Book(title="Branch Book", author="Author", date="2000-01-01", isbn="9990001112223", amount=1)
+    user = User(name="Reader", email="reader@example.com")
+    north, south = Branch(name="North"), Branch(name="South")
+    db_session.add_all([book, user, north, south])
+    db_session.commit()
+    db_session.add_all([
+        BranchStock(book_id=book.id, branch_id=north.id, amount=1),
+        BranchStock(book_id=book.id, branch_id=south.id, amount=2),
+    ])
+    db_session.commit()
+    return book, user, north, south
+
+def test_borrow_and_return_move_branch_stock(client, db_session, stocked_book):
+    book, user, north, south = stocked_book
+    headers = get_auth_header_for_user(user.email)
+    payload = {"book_id": book.id, "user_id": user.id, "branch_id": north.id}
+
+    response = client.post("/operation/borrow", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["branch id"] == north.id
+    assert db_session.get(BranchStock, (book.id, north.id)).amount == 0
+    assert db_session.get(Book, book.id).amount == 1
+    assert db_session.query(BorrowedBooks).one().branch_id == north.id
+
+    response = client.post("/operation/borrow", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # сдать можно в любом филиале, по умолчанию - туда, где взяли
+    response = client.post("/operation/return", json={"book_id": book.id, "user_id": user.id}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    db_session.expire_all()
+    assert db_session.get(BranchStock, (book.id, north.id)).amount == 1
+
+def test_availability_aggregates_branches(client, stocked_book):
+    book, user, north, south = stocked_book
+    headers = get_auth_header_for_user(user.email)
+
+    response = client.put("/branch/stock", json={"book_id": book.id, "branch_id": south.id, "amount": 5}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    data = client.get(f"/book/{book.id}/availability", headers=headers).json()
+    assert data["unassigned"] == 1
+    assert [branch["amount"] for branch in data["branches"]] == [1, 5]
+    assert data["total"] == 7
+
+    listed = client.get("/book/get", headers=headers).json()
+    assert [(row["amount"], row["branch_amount"]) for row in listed] == [(1, 6)]
+    assert client.get("/book/get", params={"book_id": book.id}, headers=headers).json()[0]["branch_amount"] == 6
+    assert client.get("/book/get", params={"ids": [book.id]}, headers=headers).json()["books"][0]["branch_amount"] == 6
+
+def test_unknown_branch(client, stocked_book):
+    book, user, north, south = stocked_book
+    payload = {"book_id": book.id, "user_id": user.id, "branch_id": 999}
+    response = client.post("/operation/borrow", json=payload, headers=get_auth_header_for_user(user.email))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
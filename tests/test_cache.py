@@ -0,0 +1,100 @@
+import time
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from cache import ListingCache
+
+
+def counting_loader(calls: list, delay: float = 0.0):
+    def loader(db):
+        calls.append(1)
+        time.sleep(delay)
+        return [len(calls)]
+    return loader
+
+def test_concurrent_gets_share_one_query(db_session):
+    cache = ListingCache(ttl=10, stale_ttl=0)
+    calls = []
+    loader = counting_loader(calls, delay=0.05)
+
+    async def run():
+        return await asyncio.gather(*[cache.get("books", loader, db_session) for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == [1] for result in results)
+
+def test_stale_result_served_while_refreshing(db_session):
+    cache = ListingCache(ttl=0, stale_ttl=10)
+    calls = []
+    loader = counting_loader(calls)
+
+    async def run():
+        first = await cache.get("books", loader, db_session)
+        stale = await cache.get("books", loader, db_session)
+        await cache.in_flight["books"]
+        return first, stale, cache.entries["books"][1]
+
+    first, stale, refreshed = asyncio.run(run())
+    assert first == [1]
+    assert stale == [1]
+    assert refreshed == [2]
+
+def test_invalidate_forces_reload(db_session):
+    cache = ListingCache(ttl=10, stale_ttl=10)
+    calls = []
+    loader = counting_loader(calls)
+
+    async def run():
+        await cache.get("books", loader, db_session)
+        cache.invalidate("books")
+        return await cache.get("books", loader, db_session)
+
+    assert asyncio.run(run()) == [2]
+
+class DisconnectingRequest:
+    def __init__(self, after: float):
+        self.after = after
+
+    async def receive(self):
+        await asyncio.sleep(self.after)
+        return {"type": "http.disconnect"}
+
+def test_disconnect_cancels_query_once_all_waiters_leave(db_session):
+    cache = ListingCache(ttl=10, stale_ttl=0)
+    finished = []
+
+    def slow_loader(db):
+        # без отмены этот запрос выполняется десятки секунд
+        try:
+            return db.execute(text(
+                "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000000000) SELECT count(*) FROM c"
+            )).scalar()
+        finally:
+            finished.append(time.monotonic())
+
+    async def get(after: float):
+        db_session.info["request"] = DisconnectingRequest(after)
+        return await cache.get("books", slow_loader, db_session)
+
+    async def run():
+        started = time.monotonic()
+        first = asyncio.create_task(get(0.05))
+        second = asyncio.create_task(get(0.3))
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        # первый клиент ушел, но второй еще ждет: запрос продолжается
+        assert finished == []
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        while not finished:
+            await asyncio.sleep(0.01)
+        return finished[0] - started
+
+    try:
+        assert asyncio.run(run()) < 2
+    finally:
+        db_session.info.pop("request", None)
+    assert cache.in_flight == {} and cache.entries == {}
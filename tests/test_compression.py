@@ -0,0 +1,79 @@
+from fastapi import FastAPI, status
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from models import Book
+from compression import CompressionMiddleware, negotiate
+from conftest import get_auth_header_for_user
+
+
+def test_negotiate_respects_quality():
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0, deflate") is None
+    assert negotiate("identity") is None
+    assert negotiate("*") is not None
+
+def test_large_listing_is_compressed_and_revalidated(client, db_session):
+    db_session.add_all([
+        Book(title=f"Book {i}", author="Author Name", date="2000-01-01", isbn=f"{i:013d}", amount=1)
+        for i in range(50)
+    ])
+    db_session.commit()
+    headers = {**get_auth_header_for_user("librarian@example.com"), "Accept-Encoding": "gzip"}
+
+    response = client.get("/book/get", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 50
+    etag = response.headers["etag"]
+
+    response = client.get("/book/get", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+def test_small_response_is_not_compressed(client):
+    headers = {**get_auth_header_for_user("librarian@example.com"), "Accept-Encoding": "gzip"}
+    response = client.get("/book/get", headers=headers)
+    assert "content-encoding" not in response.headers
+
+def make_app():
+    test_app = FastAPI()
+    payload = [{"id": i, "title": "x" * 20} for i in range(100)]
+
+    @test_app.get("/book/get")
+    async def listing():
+        return payload
+
+    @test_app.get("/stream")
+    async def stream(chunks: int = 10):
+        async def generate():
+            for _ in range(chunks):
+                yield b"y" * 30
+        return StreamingResponse(generate())
+
+    middleware = CompressionMiddleware(test_app, minimum_size=100)
+    return middleware
+
+def test_compressed_listing_bytes_are_reused():
+    middleware = make_app()
+    c = TestClient(middleware)
+    first = c.get("/book/get", headers={"Accept-Encoding": "gzip"})
+    cached = dict(middleware.cache)
+    second = c.get("/book/get", headers={"Accept-Encoding": "gzip"})
+
+    assert len(cached) == 1
+    assert middleware.cache == cached
+    assert first.json() == second.json()
+    assert first.headers["etag"] == second.headers["etag"]
+
+def test_streaming_response_is_compressed_incrementally():
+    c = TestClient(make_app())
+    response = c.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == b"y" * 300
+
+def test_short_stream_is_not_compressed():
+    c = TestClient(make_app())
+    response = c.get("/stream", params={"chunks": 3}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"y" * 90
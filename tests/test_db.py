@@ -0,0 +1,42 @@
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from db import get_db, get_db_with_deadline
+
+
+class QueryCanceled(Exception):
+    pgcode = "57014"
+
+def make_app(handler):
+    test_app = FastAPI()
+
+    @test_app.get("/slow")
+    async def slow_endpoint(db=Depends(get_db_with_deadline("query_deadline"))):
+        return await handler()
+
+    test_app.dependency_overrides[get_db] = lambda: Session()
+    return test_app
+
+def raise_wrapped(error: Exception):
+    async def handler():
+        try:
+            raise error
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    return handler
+
+def test_statement_timeout_returns_504():
+    error = OperationalError("SELECT 1", {}, QueryCanceled("canceling statement due to statement timeout"))
+    response = TestClient(make_app(raise_wrapped(error))).get("/slow")
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+
+def test_pool_timeout_returns_503():
+    response = TestClient(make_app(raise_wrapped(PoolTimeoutError("QueuePool limit reached")))).get("/slow")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+
+def test_other_errors_pass_through():
+    response = TestClient(make_app(raise_wrapped(ValueError("boom")))).get("/slow")
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
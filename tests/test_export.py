@@ -0,0 +1,72 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from models import Book, User, BorrowedBooks, ArchivedBorrowedBooks
+from export import export_snapshot, load_snapshot
+
+
+@pytest.fixture
+def history(db_session):
+    user = User(name="Test User", email="testuser@example.com")
+    books = [Book(title=f"Book {i}", author="Author", date=None, isbn=f"{i:013d}", amount=1) for i in range(2)]
+    db_session.add_all([user] + books)
+    db_session.commit()
+    borrowed = datetime(2026, 1, 10)
+    db_session.add_all([
+        BorrowedBooks(user_id=user.id, book_id=books[0].id, borrow_date=borrowed, return_date=None),
+        BorrowedBooks(user_id=user.id, book_id=books[1].id, borrow_date=borrowed, return_date=borrowed + timedelta(days=4)),
+        ArchivedBorrowedBooks(id=100, user_id=user.id, book_id=books[0].id,
+                              borrow_date=datetime(2025, 12, 1), return_date=datetime(2025, 12, 3)),
+    ])
+    db_session.commit()
+    return user, books
+
+@pytest.mark.parametrize("export_format", ["numpy", "arrow"])
+def test_export_snapshot_round_trip(db_session, history, tmp_path, export_format):
+    if export_format == "arrow":
+        pytest.importorskip("pyarrow")
+    user, books = history
+    manifest = export_snapshot(db_session, str(tmp_path), export_format, chunk_size=1)
+    assert {name: meta["rows"] for name, meta in manifest["datasets"].items()} == {
+        "library": 2, "users": 1, "borrowed_books": 3
+    }
+
+    snapshot = load_snapshot(str(tmp_path))
+    assert snapshot["library"]["title"].tolist() == ["Book 0", "Book 1"]
+    loans = snapshot["borrowed_books"]
+    assert loans["borrow_date"].dtype.kind == "M"
+    assert np.isnat(loans["return_date"]).sum() == 1
+
+    summary = json.loads((tmp_path / "summary.json").read_text())
+    assert summary["loans"] == 3
+    assert summary["active_loans"] == 1
+    assert summary["mean_loan_days"] == pytest.approx(3.0)
+    assert summary["loans_per_month"] == {"2025-12": 1, "2026-01": 2}
+    assert summary["top_books"][0] == {"book_id": books[0].id, "loans": 2}
+
+def test_export_empty_tables(db_session, tmp_path):
+    manifest = export_snapshot(db_session, str(tmp_path), "numpy")
+    assert all(meta["rows"] == 0 for meta in manifest["datasets"].values())
+
+def test_numpy_export_fits_rows_actually_read(db_session, history, tmp_path, monkeypatch):
+    import export
+    stream_rows = export.stream_rows
+
+    def changed_after_count(db_session, tables, columns, chunk_size):
+        # между COUNT(*) и чтением одна книга удалена, две добавлены (одна - с более длинным isbn, чем в схеме)
+        partitions = list(stream_rows(db_session, tables, columns, chunk_size))[1:]
+        if tables[0].name == "library":
+            for added in ({"id": 10, "title": "Added", "isbn": "1" * 20}, {"id": 11, "title": "Added too"}):
+                partitions.append([tuple(added.get(column.name) for column in columns)])
+        yield from partitions
+
+    monkeypatch.setattr(export, "stream_rows", changed_after_count)
+    manifest = export_snapshot(db_session, str(tmp_path), "numpy", chunk_size=1)
+    assert manifest["datasets"]["library"]["rows"] == 3
+    assert manifest["datasets"]["borrowed_books"]["rows"] == 2
+    library = load_snapshot(str(tmp_path))["library"]
+    assert library["title"].tolist() == ["Book 1", "Added", "Added too"]
+    assert library["isbn"].tolist() == ["0000000000001", "1" * 20, ""]
@@ -0,0 +1,84 @@
+import pytest
+
+from fastapi import status
+
+from models import Book, User, BorrowedBooks, Branch, BranchStock
+from conftest import get_auth_header_for_user
+
+
+@pytest.fixture
+def lent_out_book(db_session):
+    book = Book(title="Popular", author="Author", date="2000", isbn="7778889990001", amount=1)
+    users = [User(name=f"Reader {i}", email=f"reader{i}@example.com") for i in range(3)]
+    db_session.add_all([book, *users])
+    db_session.commit()
+    return book, users
+
+def test_return_hands_copy_to_first_hold(client, db_session, lent_out_book):
+    book, (first, second, third) = lent_out_book
+    headers = get_auth_header_for_user("desk@example.com")
+    assert client.post("/operation/borrow", json={"book_id": book.id, "user_id": first.id}, headers=headers).status_code == status.HTTP_200_OK
+    response = client.post("/operation/borrow", json={"book_id": book.id, "user_id": second.id}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    second_hold = client.post("/hold/place", json={"book_id": book.id, "user_id": second.id}, headers=headers).json()
+    third_hold = client.post("/hold/place", json={"book_id": book.id, "user_id": third.id}, headers=headers).json()
+    assert (second_hold["position"], third_hold["position"]) == (1, 2)
+    response = client.post("/hold/place", json={"book_id": book.id, "user_id": third.id}, headers=headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    response = client.post("/operation/return", json={"book_id": book.id, "user_id": first.id}, headers=headers)
+    assert response.json()["hold"]["user id"] == second.id
+    db_session.expire_all()
+    assert db_session.get(Book, book.id).amount == 0
+    loan = db_session.query(BorrowedBooks).filter_by(user_id=second.id, return_date=None).one()
+    assert loan.due_date is not None
+
+    assert client.get(f"/hold/{second_hold['hold_id']}", headers=headers).json() == {
+        **{key: second_hold[key] for key in ("hold_id", "book_id", "user_id", "created_at")},
+        "status": "fulfilled", "loan_id": loan.id
+    }
+    assert client.get(f"/hold/{third_hold['hold_id']}", headers=headers).json()["position"] == 1
+
+def test_return_without_holds_restocks(client, db_session, lent_out_book):
+    book, (first, second, _) = lent_out_book
+    headers = get_auth_header_for_user("desk@example.com")
+    client.post("/operation/borrow", json={"book_id": book.id, "user_id": first.id}, headers=headers)
+    hold = client.post("/hold/place", json={"book_id": book.id, "user_id": second.id}, headers=headers).json()
+    assert client.delete(f"/hold/cancel/{hold['hold_id']}", headers=headers).status_code == status.HTTP_200_OK
+
+    response = client.post("/operation/return", json={"book_id": book.id, "user_id": first.id}, headers=headers)
+    assert response.json()["hold"] is None
+    db_session.expire_all()
+    assert db_session.get(Book, book.id).amount == 1
+
+def test_borrowing_directly_closes_own_hold(client, db_session, lent_out_book):
+    book, (first, second, third) = lent_out_book
+    headers = get_auth_header_for_user("desk@example.com")
+    client.post("/operation/borrow", json={"book_id": book.id, "user_id": first.id}, headers=headers)
+    hold = client.post("/hold/place", json={"book_id": book.id, "user_id": second.id}, headers=headers).json()
+
+    # появился еще один экземпляр, и ждавший читатель взял его сам
+    book.amount = 1
+    db_session.commit()
+    response = client.post("/hold/place", json={"book_id": book.id, "user_id": third.id}, headers=headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"] == "Book is available, borrow it instead"
+    # экземпляр в любом филиале - тоже доступная книга
+    branch = Branch(name="North")
+    db_session.add(branch)
+    db_session.commit()
+    db_session.add(BranchStock(book_id=book.id, branch_id=branch.id, amount=1))
+    book.amount = 0
+    db_session.commit()
+    response = client.post("/hold/place", json={"book_id": book.id, "user_id": third.id}, headers=headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    book.amount = 1
+    db_session.commit()
+    loan_id = client.post("/operation/borrow", json={"book_id": book.id, "user_id": second.id}, headers=headers).json()["loan id"]
+    assert client.get(f"/hold/{hold['hold_id']}", headers=headers).json()["loan_id"] == loan_id
+
+    response = client.post("/operation/return", json={"book_id": book.id, "user_id": second.id}, headers=headers)
+    assert response.json()["hold"] is None
+    db_session.expire_all()
+    assert db_session.get(Book, book.id).amount == 1
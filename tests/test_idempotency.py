@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from fastapi import status, HTTPException
+
+from models import Book, User, BorrowedBooks, IdempotencyKey
+from operations import BorrowBookInput
+from audit import AuditLog
+from idempotency import IdempotencyStore, idempotent, IN_FLIGHT_TIMEOUT
+from conftest import get_auth_header_for_user
+
+
+def idempotency_headers(email: str, key: str):
+    return {**get_auth_header_for_user(email), "Idempotency-Key": key}
+
+@pytest.fixture
+def book_and_user(db_session):
+    book = Book(title="Retry Book", author="Author", date="2000", isbn="3334445556667", amount=2)
+    user = User(name="Reader", email="reader@example.com")
+    db_session.add_all([book, user])
+    db_session.commit()
+    return book, user
+
+def test_retried_borrow_replays_first_response(client, db_session, book_and_user):
+    book, user = book_and_user
+    headers = idempotency_headers("desk@example.com", "borrow-1")
+    payload = {"book_id": book.id, "user_id": user.id}
+
+    first = client.post("/operation/borrow", json=payload, headers=headers)
+    retry = client.post("/operation/borrow", json=payload, headers=headers)
+    assert first.status_code == retry.status_code == status.HTTP_200_OK
+    assert retry.json() == first.json()
+    assert db_session.query(BorrowedBooks).count() == 1
+
+    # ключи разных библиотекарей не пересекаются
+    other = client.post("/operation/borrow", json=payload, headers=idempotency_headers("other@example.com", "borrow-1"))
+    assert other.json()["loan id"] != first.json()["loan id"]
+
+    response = client.post("/operation/borrow", json={**payload, "user_id": user.id + 1}, headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_failed_request_is_not_stored(client, db_session, book_and_user):
+    book, user = book_and_user
+    headers = idempotency_headers("desk@example.com", "create-1")
+    payload = {"title": book.title, "author": book.author, "date": book.date, "isbn": "9998887776665", "amount": 1}
+
+    response = client.post("/book/create", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    response = client.post("/book/create", json={**payload, "title": "Second Edition"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+def test_persisted_key_survives_memory_loss(client, db_session, book_and_user, monkeypatch):
+    book, user = book_and_user
+    idempotency_store = client.app.state.idempotency_store
+    monkeypatch.setattr(idempotency_store, "persist", True)
+    headers = idempotency_headers("desk@example.com", "borrow-2")
+    payload = {"book_id": book.id, "user_id": user.id}
+    # ключ занимается отдельным соединением; общая тестовая сессия не должна держать более старый снимок sqlite
+    db_session.commit()
+
+    first = client.post("/operation/borrow", json=payload, headers=headers)
+    stored = db_session.get(IdempotencyKey, ("desk@example.com", "borrow-2"))
+    assert stored.response is not None
+
+    idempotency_store.clear()
+    retry = client.post("/operation/borrow", json=payload, headers=headers)
+    assert retry.json() == first.json()
+    assert db_session.query(BorrowedBooks).count() == 1
+
+def test_cancelled_request_releases_key(db_session, book_and_user):
+    book, user = book_and_user
+
+    async def cancelled(db):
+        raise asyncio.CancelledError()
+
+    async def borrow_request(db):
+        return {"done": True}
+
+    payload = BorrowBookInput(book_id=book.id, user_id=user.id)
+    idempotency_store = IdempotencyStore()
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(idempotent("cancel-1", "desk@example.com", "borrow", payload, db_session, idempotency_store, AuditLog(), cancelled))
+    assert asyncio.run(idempotent("cancel-1", "desk@example.com", "borrow", payload, db_session, idempotency_store, AuditLog(), borrow_request)) == {"done": True}
+
+def test_abandoned_in_flight_entry_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("idempotency.time.monotonic", lambda: clock[0])
+    idempotency_store = IdempotencyStore()
+    idempotency_store.remember(("desk@example.com", "stuck"), "fingerprint", None)
+    assert idempotency_store.lookup(("desk@example.com", "stuck")) is not None
+    clock[0] += IN_FLIGHT_TIMEOUT + 1
+    assert idempotency_store.lookup(("desk@example.com", "stuck")) is None
+
+def test_persisted_response_commits_with_operation(db_session, book_and_user):
+    book, user = book_and_user
+
+    async def fails_after_commit(db):
+        db.add(Book(title="Half Done", author="Author", date="2001", isbn="1112223334445", amount=1))
+        db.commit()
+        raise HTTPException(status_code=500, detail="crashed before the response")
+
+    payload = BorrowBookInput(book_id=book.id, user_id=user.id)
+    db_session.commit()
+    with pytest.raises(HTTPException):
+        asyncio.run(idempotent("crash-1", "desk@example.com", "borrow", payload, db_session,
+                               IdempotencyStore(persist=True), AuditLog(), fails_after_commit))
+    assert db_session.query(Book).filter_by(title="Half Done").count() == 0
+    assert db_session.get(IdempotencyKey, ("desk@example.com", "crash-1")) is None
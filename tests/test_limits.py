@@ -0,0 +1,58 @@
+from fastapi import status
+
+from limits import RateLimiter, AdmissionController, LISTING_COST, POINT_COST
+from conftest import get_auth_header_for_user, make_client
+
+
+def test_rate_limiter_refills_and_reports_wait():
+    limiter = RateLimiter(rate=1, burst=2)
+    assert limiter.acquire("a", 1) == 0
+    assert limiter.acquire("a", 1) == 0
+    assert limiter.acquire("a", 1) > 0
+    assert limiter.acquire("b", 1) == 0
+    assert limiter.rejected == {"a": 1}
+
+def test_rate_limiter_lets_full_bucket_pay_large_cost():
+    limiter = RateLimiter(rate=1, burst=5)
+    assert limiter.acquire("a", 50) == 0
+    assert limiter.acquire("a", 1) > 40
+
+def test_admission_controller_caps_concurrency():
+    controller = AdmissionController(max_concurrency=1)
+    assert controller.enter()
+    assert not controller.enter()
+    controller.leave()
+    assert controller.enter()
+    assert controller.rejected == 1
+
+def test_listing_costs_more_than_point_lookup():
+    with make_client(rate_limit_per_second=0.01, rate_limit_burst=LISTING_COST) as c:
+        headers = get_auth_header_for_user("script@example.com")
+        assert c.get("/book/get", params={"ids": [1]}, headers=headers).status_code == status.HTTP_200_OK
+        response = c.get("/book/get", headers=headers)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response.headers["Retry-After"]) > 0
+
+        other = get_auth_header_for_user("desk@example.com")
+        assert c.get("/book/get", headers=other).status_code == status.HTTP_200_OK
+
+        stats = c.get("/limits/stats", headers=other).json()
+        assert stats["rejected_by_librarian"] == {"script@example.com": 1}
+
+def test_overloaded_server_sheds_load():
+    with make_client(max_concurrent_requests=0) as c:
+        response = c.get("/book/get", headers=get_auth_header_for_user("desk@example.com"))
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+        assert c.get("/limits/stats", headers=get_auth_header_for_user("desk@example.com")).json()["rejected_overloaded"] == 1
+
+def test_batch_is_charged_once_for_its_sub_requests():
+    with make_client(rate_limit_per_second=0.01, rate_limit_burst=2 * POINT_COST) as c:
+        headers = get_auth_header_for_user("script@example.com")
+        payload = {"requests": [
+            {"method": "GET", "path": "/book/get?book_id=1"},
+            {"method": "GET", "path": "/book/get?book_id=2"},
+        ]}
+        assert c.post("/batch", json=payload, headers=headers).status_code == status.HTTP_200_OK
+        response = c.get("/book/get", params={"ids": [1]}, headers=headers)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
@@ -0,0 +1,36 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import create_app
+from settings import get_settings
+from auth import create_access_token
+
+
+def test_create_app_uses_given_settings():
+    settings = get_settings().model_copy(update={"jwt_token": "othersecret", "pool_warmup": 0})
+    custom_app = create_app(settings)
+    own_token = create_access_token({"sub": "librarian@example.com"}, settings)
+    env_token = create_access_token({"sub": "librarian@example.com"})
+
+    with TestClient(custom_app) as c:
+        response = c.get("/user/get", params={"ids": [1]}, headers={"Authorization": f"Bearer {env_token}"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        response = c.get("/user/get", params={"ids": [1]}, headers={"Authorization": f"Bearer {own_token}"})
+        assert response.status_code == status.HTTP_200_OK
+
+def test_apps_do_not_share_the_engine():
+    settings = get_settings().model_copy(update={"pool_warmup": 0})
+    first, second = create_app(settings), create_app(settings)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'librarian@example.com'}, settings)}"}
+
+    with TestClient(second) as c:
+        with TestClient(first):
+            assert first.state.engine is not second.state.engine
+            assert first.state.audit_log is not second.state.audit_log
+        # остановка первого приложения не закрывает пул второго и не останавливает его журнал аудита
+        response = c.get("/user/get", params={"ids": [1]}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert not second.state.audit_log.task.done()
+        response = c.post("/user/create", json={"name": "Reader", "email": "reader@example.com"}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+    assert second.state.audit_log.stats()["written"] == 1
@@ -4,7 +4,7 @@ from datetime import datetime
 from fastapi import status
 
 from models import Book, User, BorrowedBooks
-from auth import create_access_token
+from conftest import get_auth_header_for_user
 
 
 @pytest.fixture
@@ -27,11 +27,6 @@ def sample_book(db_session):
     db_session.commit()
     return book
 
-def get_auth_header_for_user(email: str):
-    token_data = {"sub": email}
-    access_token = create_access_token(token_data)
-    return {"Authorization": f"Bearer {access_token}"}
-
 def test_borrow_success(client, sample_user, sample_book, db_session):
     assert sample_book.amount == 2
 
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from fastapi import status
+
+from models import Book, User, BorrowedBooks, OverdueNotice
+from overdue import process_overdue_loans
+from conftest import get_auth_header_for_user
+
+
+def test_borrow_sets_due_date(client, db_session):
+    book = Book(title="Due Book", author="Author", date="2000", isbn="5556667778889", amount=1)
+    user = User(name="Reader", email="reader@example.com")
+    db_session.add_all([book, user])
+    db_session.commit()
+
+    response = client.post("/operation/borrow", json={"book_id": book.id, "user_id": user.id},
+                           headers=get_auth_header_for_user(user.email))
+    assert response.status_code == status.HTTP_200_OK
+    loan = db_session.query(BorrowedBooks).one()
+    assert loan.due_date - loan.borrow_date == timedelta(days=14)
+
+def test_overdue_loans_marked_once_in_chunks(db_session):
+    now = datetime(2026, 10, 19)
+    user = User(name="Reader", email="reader@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.add_all([
+        BorrowedBooks(user_id=user.id, book_id=book_id, borrow_date=now - timedelta(days=30),
+                      due_date=now - timedelta(days=16 - book_id))
+        for book_id in range(1, 6)
+    ] + [
+        # не просрочена и уже возвращена
+        BorrowedBooks(user_id=user.id, book_id=6, borrow_date=now, due_date=now + timedelta(days=14)),
+        BorrowedBooks(user_id=user.id, book_id=7, borrow_date=now - timedelta(days=30),
+                      due_date=now - timedelta(days=16), return_date=now - timedelta(days=20)),
+    ])
+    db_session.commit()
+
+    assert process_overdue_loans(db_session, batch_size=2, now=now) == 5
+    assert process_overdue_loans(db_session, batch_size=2, now=now) == 0
+
+    notices = db_session.query(OverdueNotice).order_by(OverdueNotice.id).all()
+    assert [notice.book_id for notice in notices] == [1, 2, 3, 4, 5]
+    marked = db_session.query(BorrowedBooks).filter(BorrowedBooks.overdue_notified_at.is_not(None)).count()
+    assert marked == 5
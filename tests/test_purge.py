@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from fastapi import status
+
+from models import Book, User, BorrowedBooks, ArchivedBorrowedBooks, Hold, RelatedBook
+from purge import purge_books, purge_users
+from conftest import get_auth_header_for_user
+
+
+def make_books(db_session, count: int, author: str = "Author"):
+    books = [Book(title=f"{author} {i}", author=author, date="2000", isbn=f"{author[:3]}{i:010d}", amount=1) for i in range(count)]
+    db_session.add_all(books)
+    db_session.commit()
+    return books
+
+def test_bulk_delete_skips_books_on_loan(client, db_session):
+    weeded = make_books(db_session, 3, author="Weeded")
+    kept = make_books(db_session, 1, author="Kept")
+    user = User(name="Reader", email="reader@example.com")
+    db_session.add(user)
+    db_session.commit()
+    db_session.add(BorrowedBooks(user_id=user.id, book_id=weeded[0].id, borrow_date=datetime.now()))
+    db_session.commit()
+    headers = get_auth_header_for_user("desk@example.com")
+
+    response = client.post("/book/delete_bulk", json={"author": "Weeded"}, headers=headers)
+    assert response.json()["deleted"] == [weeded[1].id, weeded[2].id]
+    assert response.json()["skipped"] == [weeded[0].id]
+
+    listed = [book["id"] for book in client.get("/book/get", headers=headers).json()]
+    assert listed == [weeded[0].id, kept[0].id]
+    assert client.get("/book/get", params={"ids": [weeded[1].id]}, headers=headers).json()["missing"] == [weeded[1].id]
+    assert client.delete(f"/book/delete/{weeded[0].id}", headers=headers).status_code == status.HTTP_409_CONFLICT
+    assert client.post("/book/delete_bulk", json={}, headers=headers).status_code == status.HTTP_400_BAD_REQUEST
+
+    again = client.post("/book/delete_bulk", json={"ids": [weeded[1].id, kept[0].id, 999]}, headers=headers).json()
+    assert again["deleted"] == [kept[0].id]
+    assert again["missing"] == [weeded[1].id, 999]
+    assert client.get(f"/book/{weeded[1].id}/availability", headers=headers).status_code == status.HTTP_404_NOT_FOUND
+
+def test_delete_user_with_history_then_purge(client, db_session):
+    books = make_books(db_session, 2)
+    user = User(name="Former Reader", email="former@example.com")
+    db_session.add(user)
+    db_session.commit()
+    user_id, book_ids = user.id, [book.id for book in books]
+    now = datetime.now()
+    db_session.add_all([
+        BorrowedBooks(user_id=user.id, book_id=books[0].id, borrow_date=now - timedelta(days=90), return_date=now - timedelta(days=80)),
+        Hold(book_id=books[1].id, user_id=user.id, created_at=now - timedelta(days=85)),
+        RelatedBook(book_id=books[0].id, rank=0, related_book_id=books[1].id, score=1.0),
+    ])
+    db_session.commit()
+    headers = get_auth_header_for_user("desk@example.com")
+
+    # раньше здесь был 500 из-за внешнего ключа borrowed_books
+    assert client.delete(f"/user/delete/{user.id}", headers=headers).status_code == status.HTTP_200_OK
+    assert client.get("/user/get", params={"ids": [user.id]}, headers=headers).json()["missing"] == [user.id]
+    assert db_session.query(Hold).count() == 0
+    assert client.post("/book/delete_bulk", json={"ids": [books[1].id]}, headers=headers).json()["deleted"] == [books[1].id]
+
+    assert purge_users(db_session, now=now) == 0
+    assert purge_users(db_session, now=now + timedelta(days=31)) == 1
+    assert purge_books(db_session, now=now + timedelta(days=31)) == 1
+    db_session.expire_all()
+    assert db_session.get(User, user_id) is None
+    assert db_session.get(Book, book_ids[1]) is None
+    assert db_session.get(Book, book_ids[0]) is not None
+    assert db_session.query(BorrowedBooks).count() == 0
+    assert db_session.query(ArchivedBorrowedBooks).one().user_id == user_id
+    assert db_session.query(RelatedBook).count() == 0
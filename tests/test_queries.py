@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from models import Book, User, BorrowedBooks
+from queries import book_by_id, book_exists, active_loan, active_loan_count
+
+
+def test_book_exists_handles_missing_date(db_session):
+    db_session.add_all([
+        Book(title="Dated", author="Author", date="2000", isbn="1000000000001", amount=1),
+        Book(title="Undated", author="Author", date=None, isbn="1000000000002", amount=1),
+    ])
+    db_session.commit()
+    assert book_exists(db_session, "Dated", "Author", "2000")
+    assert not book_exists(db_session, "Dated", "Author", "2001")
+    assert book_exists(db_session, "Undated", "Author", None)
+    assert not book_exists(db_session, "Dated", "Author", None)
+
+def test_cached_statements_bind_new_parameters(db_session):
+    user = User(name="Reader", email="reader@example.com")
+    books = [Book(title=f"Book {i}", author="Author", date="2000", isbn=f"200000000000{i}", amount=1) for i in range(3)]
+    db_session.add_all([user, *books])
+    db_session.commit()
+    db_session.add(BorrowedBooks(user_id=user.id, book_id=books[1].id, borrow_date=datetime.now()))
+    db_session.commit()
+
+    assert [book_by_id(db_session, book.id).title for book in books] == ["Book 0", "Book 1", "Book 2"]
+    assert book_by_id(db_session, 999) is None
+    assert active_loan_count(db_session, user.id) == 1
+    assert active_loan(db_session, user.id, books[0].id) is None
+    assert active_loan(db_session, user.id, books[1].id).book_id == books[1].id
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from fastapi import status
+
+from models import Book, User, BorrowedBooks, ArchivedBorrowedBooks, RelatedBook
+from auth import create_access_token
+from recommendations import build_incidence, top_related, build_related_books, books_affected_since
+
+
+def test_top_related_ranks_by_cosine_similarity():
+    # читатель 1: книги 10, 20; читатель 2: 10, 20, 30; читатель 3: 30
+    incidence, books = build_incidence(np.array([1, 1, 2, 2, 2, 3]), np.array([10, 20, 10, 20, 30, 30]))
+    book_index, rank, related_index, scores = top_related(incidence.tocsc(), np.arange(len(books)), top_k=1)
+
+    assert books[book_index].tolist() == [10, 20, 30]
+    assert rank.tolist() == [0, 0, 0]
+    assert books[related_index].tolist() == [20, 10, 10]
+    assert np.allclose(scores, [1.0, 1.0, 0.5])
+
+def make_history(db_session):
+    users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(3)]
+    books = [Book(title=f"Book {i}", author="Author", date="2000", isbn=f"{i:013d}", amount=5) for i in range(3)]
+    db_session.add_all(users + books)
+    db_session.commit()
+    now = datetime.now()
+    db_session.add_all([
+        BorrowedBooks(user_id=users[0].id, book_id=books[0].id, borrow_date=now, return_date=None),
+        BorrowedBooks(user_id=users[0].id, book_id=books[1].id, borrow_date=now, return_date=None),
+        BorrowedBooks(user_id=users[1].id, book_id=books[1].id, borrow_date=now - timedelta(days=10), return_date=None),
+        ArchivedBorrowedBooks(id=100, user_id=users[1].id, book_id=books[2].id,
+                              borrow_date=now - timedelta(days=90), return_date=now - timedelta(days=80)),
+    ])
+    db_session.commit()
+    return users, books
+
+def test_related_endpoint_serves_built_neighbours(client, db_session):
+    users, books = make_history(db_session)
+    assert build_related_books(db_session) == 4
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'librarian@example.com'})}"}
+
+    response = client.get(f"/book/{books[1].id}/related", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [book["id"] for book in response.json()] == [books[0].id, books[2].id]
+
+    response = client.get("/book/999/related", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_incremental_build_touches_only_affected_books(db_session):
+    users, books = make_history(db_session)
+    affected = books_affected_since(db_session, datetime.now() - timedelta(days=1))
+    assert sorted(affected) == [books[0].id, books[1].id]
+
+    build_related_books(db_session, affected)
+    assert {row.book_id for row in db_session.query(RelatedBook).all()} == {books[0].id, books[1].id}
+
+def test_rebuild_drops_books_without_history(db_session):
+    users, books = make_history(db_session)
+    build_related_books(db_session)
+    assert db_session.query(RelatedBook).filter_by(book_id=books[2].id).count() == 1
+
+    db_session.query(ArchivedBorrowedBooks).delete()
+    db_session.commit()
+    build_related_books(db_session, [books[2].id])
+    assert db_session.query(RelatedBook).filter_by(book_id=books[2].id).count() == 0
+
+    db_session.query(BorrowedBooks).delete()
+    db_session.commit()
+    assert build_related_books(db_session) == 0
+    assert db_session.query(RelatedBook).count() == 0
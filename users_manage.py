@@ -1,16 +1,21 @@
 import os
 import json
 from typing import Optional
+from datetime import datetime, timedelta
 
 from fastapi import Depends, HTTPException, APIRouter, Query
 from pydantic import BaseModel, Field, EmailStr
+from sqlalchemy import select, exists
 from sqlalchemy.orm import Session
 
-from models import User
-from db import get_db
-from auth import verify_token
+from models import User, BorrowedBooks, ArchivedBorrowedBooks, Hold
+from db import get_db_with_deadline, fetch_by_ids, MAX_BATCH_IDS, MAX_BULK_DELETE_IDS
+from limits import rate_limited, admission, listing_cost, POINT_COST, LISTING_COST
+from audit import AuditLog, app_audit_log
+from queries import user_by_id
+from purge import soft_delete_rows
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(admission)])
 
 class UserInput(BaseModel):
     name: str
@@ -18,6 +23,9 @@ class UserInput(BaseModel):
 class UserUpdate(BaseModel):
     name: Optional[str] = None
     email: Optional[EmailStr] = None
+class UserBulkDelete(BaseModel):
+    ids: list[int] | None = Field(default=None, max_length=MAX_BULK_DELETE_IDS)
+    inactive_days: int | None = Field(default=None, ge=1)
 
 async def create_new_user(user: UserInput, db: Session):
     try:
@@ -31,7 +39,7 @@ async def create_new_user(user: UserInput, db: Session):
         )
         db.add(new_user)
         db.commit()
-        return {"status": "success", "email": user.email}
+        return {"status": "success", "email": user.email, "user_id": new_user.id}
     except HTTPException:
         raise
     except Exception as e:
@@ -40,7 +48,7 @@ async def create_new_user(user: UserInput, db: Session):
 async def get_users(user_id: int, db: Session):
     try:
         if user_id is not None:
-            user = db.query(User).filter(User.id==user_id).first()
+            user = user_by_id(db, user_id)
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
             data = [{
@@ -49,7 +57,7 @@ async def get_users(user_id: int, db: Session):
             }]
             return data
         else:
-            users = db.query(User).all()
+            users = db.query(User).filter(User.deleted_at.is_(None)).all()
             data = [{
                 "id": user.id,
                 "name": user.name,
@@ -63,9 +71,28 @@ async def get_users(user_id: int, db: Session):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+async def get_users_by_ids(ids: list[int], db: Session):
+    try:
+        if len(ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_BATCH_IDS})")
+        users, missing = fetch_by_ids(db, User, ids)
+        data = [{
+            "id": user.id,
+            "name": user.name,
+            "email": user.email
+        } for user in users]
+        return {
+            "users": data,
+            "missing": missing
+            }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
 async def update_user(user_id: int, user_data: UserUpdate, db: Session):
     try:
-        user = db.query(User).filter_by(id=user_id).first()
+        user = user_by_id(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -86,10 +113,14 @@ async def update_user(user_id: int, user_data: UserUpdate, db: Session):
 
 async def delete_user(user_id: int, db: Session):
     try:
-        user = db.query(User).filter_by(id=user_id).first()
+        user = user_by_id(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        db.delete(user)
+        _, skipped, missing = soft_delete_rows(db, User, BorrowedBooks.user_id, Hold.user_id, [user.id])
+        if missing:
+            raise HTTPException(status_code=404, detail="User not found")
+        if skipped:
+            raise HTTPException(status_code=409, detail="User has unreturned books")
         db.commit()
         return {"status": "success", "email": user.email}
     except HTTPException:
@@ -98,15 +129,58 @@ async def delete_user(user_id: int, db: Session):
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 
+async def delete_users(criteria: UserBulkDelete, db: Session):
+    try:
+        if not (criteria.ids or criteria.inactive_days):
+            raise HTTPException(status_code=400, detail="Specify ids or a filter")
+        query = select(User.id).where(User.deleted_at.is_(None))
+        if criteria.ids:
+            query = query.where(User.id.in_(criteria.ids))
+        if criteria.inactive_days:
+            # ничего не брали за последние inactive_days дней (включая архив выдач)
+            since = datetime.now() - timedelta(days=criteria.inactive_days)
+            query = query.where(
+                ~exists().where(BorrowedBooks.user_id == User.id, BorrowedBooks.borrow_date >= since),
+                ~exists().where(ArchivedBorrowedBooks.user_id == User.id, ArchivedBorrowedBooks.borrow_date >= since)
+            )
+        ids = db.scalars(query.order_by(User.id)).all()
+        deleted, skipped, missing = soft_delete_rows(db, User, BorrowedBooks.user_id, Hold.user_id, ids)
+        if criteria.ids:
+            # как в fetch_by_ids: запрошенные id, которых нет, которые уже удалены или не подошли под фильтр
+            found = set(ids)
+            missing += [i for i in dict.fromkeys(criteria.ids) if i not in found]
+        db.commit()
+        return {"status": "success", "deleted": deleted, "skipped": skipped, "missing": missing}
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
 @router.post("/user/create", response_model=dict)
-async def user_create_endpoint(user: UserInput, current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
-    return await create_new_user(user, db)
-@router.get("/user/get", response_model=list)
-async def user_get_endpoint(user_id: int | None = Query(default=None), current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
+async def user_create_endpoint(user: UserInput, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await create_new_user(user, db)
+    await audit_log.record(current_user, "create", "user", result["user_id"])
+    return result
+@router.get("/user/get", response_model=list | dict)
+async def user_get_endpoint(user_id: int | None = Query(default=None), ids: list[int] | None = Query(default=None), current_user: str = Depends(rate_limited(listing_cost("user_id", "ids"))), db: Session = Depends(get_db_with_deadline("listing_query_deadline"))):
+    if ids:
+        return await get_users_by_ids(ids, db)
     return await get_users(user_id, db)
 @router.put("/user/update/{user_id}", response_model=dict)
-async def user_update_endpoint(user_id: int, user_data: UserUpdate, current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
-    return await update_user(user_id, user_data, db)
+async def user_update_endpoint(user_id: int, user_data: UserUpdate, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await update_user(user_id, user_data, db)
+    await audit_log.record(current_user, "update", "user", user_id)
+    return result
 @router.delete("/user/delete/{user_id}", response_model=dict)
-async def user_delete_endpoint(user_id: int, current_user: str = Depends(verify_token), db: Session = Depends(get_db)):
-    return await delete_user(user_id, db)
\ No newline at end of file
+async def user_delete_endpoint(user_id: int, current_user: str = Depends(rate_limited(POINT_COST)), db: Session = Depends(get_db_with_deadline("query_deadline")), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await delete_user(user_id, db)
+    await audit_log.record(current_user, "delete", "user", user_id)
+    return result
+@router.post("/user/delete_bulk", response_model=dict)
+async def user_delete_bulk_endpoint(criteria: UserBulkDelete, current_user: str = Depends(rate_limited(LISTING_COST)), db: Session = Depends(get_db_with_deadline("listing_query_deadline")), audit_log: AuditLog = Depends(app_audit_log)):
+    result = await delete_users(criteria, db)
+    for user_id in result["deleted"]:
+        await audit_log.record(current_user, "delete", "user", user_id)
+    return result